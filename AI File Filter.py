@@ -1,191 +1,233 @@
+import time
+STARTUP_TIME = time.perf_counter()  # Measured before the heavy imports, to report the cold start
 import sys
 import os
-import shutil
-import requests
-import json
-import time
-import re  # Import regex library
+import itertools
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QPushButton, QLabel, QFileDialog, QLineEdit, 
-                             QProgressBar, QListWidget, QMessageBox, QHBoxLayout, 
-                             QSlider, QComboBox, QCheckBox, QScrollArea, QGroupBox, QListWidgetItem, QSizePolicy, QMenuBar, QMenu, QAction)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QSize
+                             QProgressBar, QListView, QMessageBox, QHBoxLayout, 
+                             QSlider, QComboBox, QCheckBox, QScrollArea, QGroupBox, QMenuBar, QMenu, QAction,
+                             QSpinBox, QTableWidget, QTableWidgetItem, QInputDialog, QHeaderView,
+                             QStyledItemDelegate, QStyleOptionButton, QStyleOptionViewItem, QStyle)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QSize, QRect, QEvent, QAbstractListModel, QModelIndex
 from PyQt5.QtGui import QIcon
-import subprocess  # Import subprocess to run external files
+from file_filter_core import (APP_DATA_DIR, ClassificationCache, FileClassifier, OperationLog, name_instruction, numpy_available, pillow_available, pypdf_available, scan_files)
+from ollama_client import DEFAULT_BASE_URL, OllamaClient, OllamaError
 
 # Classification Thread
 class ClassificationThread(QThread):
     progress_changed = pyqtSignal(int)
     status_message = pyqtSignal(str)
-    file_copied = pyqtSignal(str, str)  # Emit file name and action type
-
-    def __init__(self, source_folder, destination_folder, classification_key, level, move_files, selected_model, selected_extensions, custom_prompt=None):
+    file_copied = pyqtSignal(str, str, str)  # Emit file name, action type and destination path
+    metrics_changed = pyqtSignal(object)  # Emit a RunMetrics snapshot (throughput, ETA, stage timings)
+    preview_ready = pyqtSignal(object)  # Emit the summary of a dry run
+
+    def __init__(self, *args, watch=False, preview_size=0, **kwargs):
+        # Takes the same arguments as FileClassifier and forwards its callbacks as signals.
+        # With watch=True the thread keeps classifying new arrivals until it is cancelled; with
+        # preview_size set it only classifies a sample of that size and touches no files.
         super().__init__()
-        self.source_folder = source_folder
-        self.destination_folder = destination_folder
-        self.classification_key = classification_key
-        self.level = level
-        self.move_files = move_files
-        self.selected_model = selected_model
-        self.selected_extensions = selected_extensions
-        self.custom_prompt = custom_prompt
-
-    def classify_image(self, image_path):
-        file_name_without_extension = os.path.splitext(os.path.basename(image_path))[0]
-        file_name_without_extension = re.sub(r'\(\d+\)', '', file_name_without_extension).strip()
-
-        url = "http://localhost:11434/v1/chat/completions"
-        headers = {"Content-Type": "application/json"}
-
-        if self.custom_prompt:
-            prompt = f'"{file_name_without_extension}", {self.custom_prompt}'
-        else:
-            level_prompts = {
-                0: f"Could '{file_name_without_extension}' be considered related to '{self.classification_key}'?",
-                1: f"Could '{file_name_without_extension}' be loosely associated with the concept or category of '{self.classification_key}'?",
-                2: f"Could '{file_name_without_extension}' be loosely associated with the concept or category of '{self.classification_key}'?",
-                3: f"Would you say that '{file_name_without_extension}' is somewhat related to the concept or category of '{self.classification_key}'?",
-                4: f"Would you say that '{file_name_without_extension}' is somewhat related to the concept or category of '{self.classification_key}'?",
-                5: f"Can '{file_name_without_extension}' be categorized as '{self.classification_key}'?",
-                6: f"Does '{file_name_without_extension}' have a clear and direct connection to the concept or category of '{self.classification_key}'?",
-                7: f"Is '{file_name_without_extension}' strongly related to the concept or category of '{self.classification_key}'?",
-                8: f"Does '{file_name_without_extension}' specifically and explicitly represent the concept or category of '{self.classification_key}'?"
-            }
-            prompt = level_prompts[self.level]
-
-        data = {
-            "model": self.selected_model,
-            "messages": [{"role": "user", "content": prompt}]
-        }
+        self.watch = watch
+        self.preview_size = preview_size
+        self.classifier = FileClassifier(*args, progress_callback=self.progress_changed.emit,
+                                         status_callback=self.status_message.emit,
+                                         file_callback=self.file_copied.emit,
+                                         metrics_callback=self.metrics_changed.emit, **kwargs)
 
+    def run(self):
         try:
-            response = requests.post(url, headers=headers, json=data)
-            result = response.json()
-            message = result['choices'][0]['message']['content'].strip().lower()
-
-            if "yes" in message:
-                return True
-            elif "no" in message:
-                return False
+            if self.preview_size:
+                summary = self.classifier.preview(self.preview_size)
+                if summary is not None:
+                    self.preview_ready.emit(summary)
+            elif self.watch:
+                self.classifier.watch()
             else:
-                return None
-        except Exception as e:
-            self.status_message.emit(f"Error: {e}")
-            return None
-
-    def move_or_copy_file(self, source_path, destination_path):
-        # Check if destination file already exists
-        if os.path.exists(destination_path):
-            # Rename the file if it already exists at the destination
-            base, ext = os.path.splitext(destination_path)
-            count = 1
-            new_destination = f"{base}_{count}{ext}"
-            while os.path.exists(new_destination):
-                count += 1
-                new_destination = f"{base}_{count}{ext}"
-            destination_path = new_destination
-
-        # Perform the move or copy operation based on the move_files flag
-        if self.move_files:
-            shutil.move(source_path, destination_path)  # Move the file
-        else:
-            shutil.copy(source_path, destination_path)  # Copy the file
+                self.classifier.run()
+        finally:
+            # Every run gets its own client; with several servers it also stops the health check thread
+            self.classifier.client.close()
 
-    def run(self):
-        files = [f for f in os.listdir(self.source_folder) if any(f.endswith(ext) for ext in self.selected_extensions)]
-        total_files = len(files)
+    def cancel(self):
+        self.classifier.cancel()
 
-        if not os.path.exists(self.destination_folder):
-            os.makedirs(self.destination_folder)
+# Extension Scan Thread
+class ExtensionScanThread(QThread):
+    extensions_found = pyqtSignal(object)  # Emit the set of extensions found in the folder
 
-        for index, file_name in enumerate(files, start=1):
-            file_path = os.path.join(self.source_folder, file_name)
-            destination_path = os.path.join(self.destination_folder, file_name)
+    def __init__(self, folder, recursive=False, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.recursive = recursive
 
-            if file_path == destination_path:
-                self.status_message.emit(f"Skipping {file_name}: Source and destination are the same.")
-                continue
+    def run(self):
+        extensions = set()
+        for file_name in scan_files(self.folder, recursive=self.recursive):
+            ext = os.path.splitext(file_name)[1].lower()
+            if ext:
+                extensions.add(ext)
+        self.extensions_found.emit(extensions)
+
+# Model List Thread
+class ModelListThread(QThread):
+    models_loaded = pyqtSignal(list)  # Emit model names, or a single error entry
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
 
-            if self.classify_image(file_path):
-                # Call move_or_copy_file, which handles both moving and copying
-                self.move_or_copy_file(file_path, destination_path)
-                action = 'moved' if self.move_files else 'copied'
-                self.file_copied.emit(file_name, action)
+    def run(self):
+        try:
+            client = OllamaClient(self.base_url, retries=0)
+        except ImportError:
+            self.models_loaded.emit(["Error: The requests library is not installed"])
+            return
+        except OllamaError as e:
+            self.models_loaded.emit([f"Error: {e}"])  # Malformed server URL
+            return
+        try:
+            self.models_loaded.emit(client.list_models())
+        except OllamaError:
+            self.models_loaded.emit(["Error: Cannot connect to Ollama"])
+        finally:
+            client.close()
 
-            self.progress_changed.emit(int((index / total_files) * 100))
-            self.status_message.emit(f"Processing {index}/{total_files}: {file_name}")
+# Model Warmup Thread
+class ModelWarmupThread(QThread):
+    warmed = pyqtSignal(str, float, str)  # Emit the model, the load time and an error message ('' on success)
 
-# FileItemWidget Class
-class FileItemWidget(QWidget):
-    def __init__(self, file_name, parent=None):
+    def __init__(self, base_url, model, parent=None):
         super().__init__(parent)
-        self.file_name = file_name
-        self.init_ui()
-
-    def init_ui(self):
-        layout = QHBoxLayout()
-        self.setLayout(layout)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.setSpacing(0)
-
-        button_container = QWidget()
-        button_layout = QHBoxLayout(button_container)
-        button_layout.setContentsMargins(5, 5, 5, 5)
-        button_layout.setAlignment(Qt.AlignLeft)
-        button_container.setFixedWidth(50)
-
-        self.undo_button = QPushButton("-")
-        self.undo_button.setFixedSize(30, 30)
-        button_layout.addWidget(self.undo_button)
-        
-        layout.addWidget(button_container)
-
-        self.label = QLabel(self.file_name)
-        self.label.setWordWrap(False)
-        self.label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
-        layout.addWidget(self.label)
-
-        self.setFixedHeight(40)
+        self.base_url = base_url
+        self.model = model
 
-    def sizeHint(self):
-        return QSize(self.width(), 40)
+    def run(self):
+        try:
+            with OllamaClient(self.base_url, retries=0) as client:
+                seconds = client.preload(self.model)
+            self.warmed.emit(self.model, seconds, '')
+        except ImportError:
+            self.warmed.emit(self.model, 0.0, "The requests library is not installed")
+        except OllamaError as e:
+            self.warmed.emit(self.model, 0.0, str(e))
+
+# Revert Thread
+class RevertThread(QThread):
+    progress_changed = pyqtSignal(int)
+    revert_done = pyqtSignal(int, object)  # Emit the number reverted and a list of (destination, error) pairs
 
-# ProcessingItemWidget Class
-class ProcessingItemWidget(QWidget):
-    def __init__(self, process_message, show_add_button=True, parent=None):
+    def __init__(self, operation_log, destination_paths=None, parent=None):
+        # Reverts the listed destinations of operation_log, or everything it still holds
         super().__init__(parent)
-        self.process_message = process_message
-        self.show_add_button = show_add_button
-        self.init_ui()
-
-    def init_ui(self):
-        layout = QHBoxLayout()
-        self.setLayout(layout)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.setSpacing(0)
-
-        button_container = QWidget()
-        button_layout = QHBoxLayout(button_container)
-        button_layout.setContentsMargins(5, 5, 5, 5)
-        button_layout.setAlignment(Qt.AlignLeft)
-        button_container.setFixedWidth(50)
-
-        if self.show_add_button:
-            self.add_button = QPushButton("+")
-            self.add_button.setFixedSize(30, 30)
-            button_layout.addWidget(self.add_button)
-        
-        layout.addWidget(button_container)
+        self.operation_log = operation_log
+        self.destination_paths = destination_paths
 
-        self.label = QLabel(self.process_message)
-        self.label.setWordWrap(False)
-        self.label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
-        layout.addWidget(self.label)
+    def run(self):
+        total = len(self.destination_paths) if self.destination_paths is not None else len(self.operation_log.pending())
+        counter = itertools.count(1)  # next() is atomic, the callback runs on several pool threads
+        last_percent = [-1]
+
+        def report(entry, error):
+            percent = int(next(counter) * 100 / max(total, 1))
+            if percent != last_percent[0]:
+                last_percent[0] = percent
+                self.progress_changed.emit(percent)
+
+        reverted, errors = self.operation_log.revert(self.destination_paths, callback=report)
+        self.operation_log.close()
+        self.revert_done.emit(reverted, errors)
+
+# Roles carried by each MessageListModel row besides its display text
+FileNameRole = Qt.UserRole + 1
+ButtonRole = Qt.UserRole + 2
+
+# MessageListModel Class
+class MessageListModel(QAbstractListModel):
+    # Rows are (text, file name, show button) tuples; with max_rows set, the oldest rows are
+    # dropped so memory stays bounded however many files a run processes
+    def __init__(self, max_rows=None, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.max_rows = max_rows
 
-        self.setFixedHeight(40)
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
 
-    def sizeHint(self):
-        return QSize(self.width(), 40)
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        text, file_name, show_button = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == FileNameRole:
+            return file_name
+        if role == ButtonRole:
+            return show_button
+        return None
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+        if self.max_rows is not None and len(self.rows) > self.max_rows:
+            overflow = len(self.rows) - self.max_rows
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            del self.rows[:overflow]
+            self.endRemoveRows()
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.endResetModel()
+
+    def remove_files(self, file_names):
+        # One reset instead of a removal per row, so bulk reverts stay fast
+        self.beginResetModel()
+        self.rows = [row for row in self.rows if row[1] not in file_names]
+        self.endResetModel()
+
+# ButtonItemDelegate Class
+class ButtonItemDelegate(QStyledItemDelegate):
+    # Paints a small push button in front of each row's text instead of creating widgets
+    button_clicked = pyqtSignal(int)  # Emit the row whose button was clicked
+
+    def __init__(self, button_text, parent=None):
+        super().__init__(parent)
+        self.button_text = button_text
+
+    def button_rect(self, rect):
+        return QRect(rect.x() + 5, rect.y() + 5, 30, 30)
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), 40)
+
+    def paint(self, painter, option, index):
+        if index.data(ButtonRole):
+            button_option = QStyleOptionButton()
+            button_option.rect = self.button_rect(option.rect)
+            button_option.text = self.button_text
+            button_option.state = QStyle.State_Enabled | QStyle.State_Raised
+            QApplication.style().drawControl(QStyle.CE_PushButton, button_option, painter)
+
+        text_option = QStyleOptionViewItem(option)
+        self.initStyleOption(text_option, index)
+        text_option.rect = option.rect.adjusted(50, 0, 0, 0)
+        text_option.displayAlignment = Qt.AlignLeft | Qt.AlignVCenter
+        QApplication.style().drawControl(QStyle.CE_ItemViewItem, text_option, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.MouseButtonRelease and index.data(ButtonRole)
+                and self.button_rect(option.rect).contains(event.pos())):
+            self.button_clicked.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
 
 # Main Application Class
 class ImageClassifierApp(QMainWindow):
@@ -199,11 +241,16 @@ class ImageClassifierApp(QMainWindow):
         self.timer.timeout.connect(self.update_time)
         self.file_extensions = []
         self.extension_checkboxes = []
+        self.extension_scan_thread = None
         self.system_extensions = {'.ini', '.sys', '.dll', '.exe', '.bat', '.com', '.cmd'}
         self.custom_prompt = ''
         self.is_using_custom_prompt = False
-        self.copied_files = {}
+        self.copied_files = {}  # destination path -> file name; rows are keyed by destination
+        self.copied_names = set()
         self.processing_files = {}
+        self.priority_files = []  # Paths relative to the source folder, classified before the rest
+        self.classification_cache = None
+        self.revert_thread = None
 
         # Add About Page Button/Menu
         self.about_action = QAction("About", self)
@@ -219,8 +266,9 @@ class ImageClassifierApp(QMainWindow):
         # Path to the external .exe file
         exe_path = r"G:\Programs Data - media\Auto HotKey Scripts\TouchPortal AHK Scripts\AI Files Sorter\exe version\dist\Python Apps About Page.exe"
         
-        # Launch the .exe file using subprocess
+        # Launch the .exe file using subprocess (imported here, it is only needed for this)
         try:
+            import subprocess
             subprocess.Popen([exe_path])
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to open About page: {e}")
@@ -259,10 +307,101 @@ class ImageClassifierApp(QMainWindow):
         self.dest_path_label = QLabel('', self)
         layout.addWidget(self.dest_path_label)
 
+        servers_layout = QHBoxLayout()
+        servers_layout.addWidget(QLabel('Inference Servers:', self))
+        self.servers_input = QLineEdit(DEFAULT_BASE_URL, self)
+        self.servers_input.setToolTip('Comma separated; requests are spread over all servers. '
+                                      'Prefix OpenAI-compatible servers (llama.cpp, vLLM) with "openai:"')
+        self.servers_input.editingFinished.connect(self.refresh_models)
+        servers_layout.addWidget(self.servers_input)
+        layout.addLayout(servers_layout)
+
+        # The selected model is loaded on the server shortly after it is picked, so the first
+        # classification does not wait for it; the delay skips models scrolled past
+        self.model_warmup_thread = None
+        self.warmup_timer = QTimer(self)
+        self.warmup_timer.setSingleShot(True)
+        self.warmup_timer.setInterval(500)
+        self.warmup_timer.timeout.connect(self.warm_up_model)
+
         self.model_selector = QComboBox(self)
-        self.model_selector.addItems(self.get_available_models())
+        self.model_selector.addItem('Loading models...')
         self.model_selector.currentTextChanged.connect(self.update_selected_model)
         layout.addWidget(self.model_selector)
+        self.refresh_models()
+
+        concurrency_layout = QHBoxLayout()
+        concurrency_layout.addWidget(QLabel('Parallel Requests:', self))
+        self.concurrency_spinbox = QSpinBox(self)
+        self.concurrency_spinbox.setMinimum(1)
+        self.concurrency_spinbox.setMaximum(64)
+        self.concurrency_spinbox.setValue(1)
+        self.concurrency_spinbox.setToolTip('Match this to OLLAMA_NUM_PARALLEL on the server')
+        concurrency_layout.addWidget(self.concurrency_spinbox)
+        self.adaptive_checkbox = QCheckBox('Adapt to latency', self)
+        self.adaptive_checkbox.setToolTip('Start with one request and add more while replies stay fast, '
+                                          'up to Parallel Requests; back off when they slow down or fail')
+        concurrency_layout.addWidget(self.adaptive_checkbox)
+        concurrency_layout.addWidget(QLabel('Files per Request:', self))
+        self.batch_size_spinbox = QSpinBox(self)
+        self.batch_size_spinbox.setMinimum(1)
+        self.batch_size_spinbox.setMaximum(100)
+        self.batch_size_spinbox.setValue(1)
+        self.batch_size_spinbox.setToolTip('Pack several file names into one prompt; tune per model')
+        concurrency_layout.addWidget(self.batch_size_spinbox)
+        layout.addLayout(concurrency_layout)
+
+        self.use_cache_checkbox = QCheckBox('Reuse cached classification results', self)
+        self.use_cache_checkbox.setChecked(True)
+        layout.addWidget(self.use_cache_checkbox)
+
+        self.resume_checkbox = QCheckBox('Resume interrupted runs', self)
+        self.resume_checkbox.setChecked(True)
+        layout.addWidget(self.resume_checkbox)
+
+        dedupe_layout = QHBoxLayout()
+        self.dedupe_checkbox = QCheckBox('Classify identical files once', self)
+        dedupe_layout.addWidget(self.dedupe_checkbox)
+        self.skip_duplicates_checkbox = QCheckBox('Skip files already in the destination', self)
+        dedupe_layout.addWidget(self.skip_duplicates_checkbox)
+        layout.addLayout(dedupe_layout)
+
+        self.group_names_checkbox = QCheckBox('Classify one file per group of similar names (e.g. trip_paris_001 ... 900)', self)
+        self.group_names_checkbox.setToolTip('Numbers, dates and camera prefixes are ignored when grouping; every 20th file of a group is still checked')
+        layout.addWidget(self.group_names_checkbox)
+
+        self.retry_answers_checkbox = QCheckBox('Ask again when the model gives an unclear answer', self)
+        self.retry_answers_checkbox.setChecked(True)
+        layout.addWidget(self.retry_answers_checkbox)
+
+        self.constrained_checkbox = QCheckBox('Short constrained answers (JSON schema, decided by yes/no probability)', self)
+        self.constrained_checkbox.setToolTip('Faster replies; the level sets how sure the model must be when the server returns logprobs')
+        layout.addWidget(self.constrained_checkbox)
+
+        prefilter_layout = QHBoxLayout()
+        self.prefilter_checkbox = QCheckBox('Pre-filter with embedding model:', self)
+        prefilter_layout.addWidget(self.prefilter_checkbox)
+        self.prefilter_model_input = QLineEdit('nomic-embed-text', self)
+        prefilter_layout.addWidget(self.prefilter_model_input)
+        if not numpy_available():
+            self.prefilter_checkbox.setEnabled(False)
+            self.prefilter_checkbox.setToolTip('Install numpy to enable the embedding pre-filter')
+        layout.addLayout(prefilter_layout)
+
+        vision_layout = QHBoxLayout()
+        self.vision_checkbox = QCheckBox('Judge images by their content with vision model:', self)
+        vision_layout.addWidget(self.vision_checkbox)
+        self.vision_model_input = QLineEdit('llava', self)
+        vision_layout.addWidget(self.vision_model_input)
+        if not pillow_available():
+            self.vision_checkbox.setEnabled(False)
+            self.vision_checkbox.setToolTip('Install Pillow to classify images by their content')
+        layout.addLayout(vision_layout)
+
+        self.read_documents_checkbox = QCheckBox('Read the start of documents (text, CSV, DOCX, PDF)', self)
+        self.read_documents_checkbox.setToolTip('The first 4 KB of text is added to the question' +
+                                                ('' if pypdf_available() else '; install pypdf to read PDF files'))
+        layout.addWidget(self.read_documents_checkbox)
 
         self.extension_scroll_area = QScrollArea()
         self.extension_widget = QWidget()
@@ -272,6 +411,31 @@ class ImageClassifierApp(QMainWindow):
         self.extension_scroll_area.setMaximumHeight(150)
         layout.addWidget(self.extension_scroll_area)
 
+        self.recursive_checkbox = QCheckBox('Include subfolders', self)
+        self.recursive_checkbox.toggled.connect(self.update_file_extensions)
+        layout.addWidget(self.recursive_checkbox)
+
+        self.watch_checkbox = QCheckBox('Keep watching the source folder for new files (low priority)', self)
+        self.watch_checkbox.setToolTip('After the run, new or renamed files are classified once they have finished writing')
+        layout.addWidget(self.watch_checkbox)
+
+        order_layout = QHBoxLayout()
+        order_layout.addWidget(QLabel('Process files:', self))
+        self.order_combo = QComboBox(self)
+        for label, order in (('In folder order', 'scan'), ('Newest first', 'newest'), ('Oldest first', 'oldest'),
+                             ('Largest first', 'largest'), ('Smallest first', 'smallest')):
+            self.order_combo.addItem(label, order)
+        self.order_combo.setToolTip('Any order but folder order lists the whole folder before the first request')
+        order_layout.addWidget(self.order_combo)
+        self.priority_files_btn = QPushButton('Process First...', self)
+        self.priority_files_btn.setToolTip('Pick files to classify before all others; cancel the dialog to clear the selection')
+        self.priority_files_btn.clicked.connect(self.select_priority_files)
+        order_layout.addWidget(self.priority_files_btn)
+        self.priority_files_label = QLabel('', self)
+        order_layout.addWidget(self.priority_files_label)
+        order_layout.addStretch()
+        layout.addLayout(order_layout)
+
         self.custom_prompt_btn = QPushButton('Use Custom Prompt', self)
         self.custom_prompt_btn.clicked.connect(self.toggle_prompt_mode)
         layout.addWidget(self.custom_prompt_btn)
@@ -300,13 +464,49 @@ class ImageClassifierApp(QMainWindow):
 
         layout.addWidget(self.prompt_group_box)
 
+        self.routing_checkbox = QCheckBox('Sort into multiple categories in one pass', self)
+        self.routing_checkbox.toggled.connect(self.toggle_routing_mode)
+        layout.addWidget(self.routing_checkbox)
+
+        self.routing_group_box = QGroupBox('Category Routing')
+        routing_group_layout = QVBoxLayout()
+        self.routing_group_box.setLayout(routing_group_layout)
+
+        self.category_table = QTableWidget(0, 2, self)
+        self.category_table.setHorizontalHeaderLabels(['Category', 'Destination Folder'])
+        self.category_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.category_table.setMaximumHeight(150)
+        routing_group_layout.addWidget(self.category_table)
+
+        routing_buttons_layout = QHBoxLayout()
+        self.add_category_btn = QPushButton('Add Category', self)
+        self.add_category_btn.clicked.connect(self.add_category)
+        routing_buttons_layout.addWidget(self.add_category_btn)
+        self.remove_category_btn = QPushButton('Remove Category', self)
+        self.remove_category_btn.clicked.connect(self.remove_category)
+        routing_buttons_layout.addWidget(self.remove_category_btn)
+        routing_group_layout.addLayout(routing_buttons_layout)
+
+        self.routing_group_box.setVisible(False)
+        layout.addWidget(self.routing_group_box)
+
         self.custom_prompt_input = QLineEdit(self)
         self.custom_prompt_input.setPlaceholderText('Enter your custom prompt here')
         self.custom_prompt_input.setVisible(False)
         layout.addWidget(self.custom_prompt_input)
 
+        time_layout = QHBoxLayout()
         self.time_label = QLabel('Time taken: 00:00:00', self)
-        layout.addWidget(self.time_label)
+        time_layout.addWidget(self.time_label)
+        self.throughput_label = QLabel('', self)
+        time_layout.addWidget(self.throughput_label)
+        time_layout.addStretch()
+        self.export_report_btn = QPushButton('Export Run Report', self)
+        self.export_report_btn.setToolTip('Save per-stage timings (scan, prompt, HTTP, parse, transfer) as JSON, CSV or Prometheus text')
+        self.export_report_btn.setEnabled(False)
+        self.export_report_btn.clicked.connect(self.export_run_report)
+        time_layout.addWidget(self.export_report_btn)
+        layout.addLayout(time_layout)
 
         self.progress_bar = QProgressBar(self)
         layout.addWidget(self.progress_bar)
@@ -315,16 +515,67 @@ class ImageClassifierApp(QMainWindow):
         self.classify_btn.clicked.connect(self.toggle_classification)  # Changed to toggle function
         layout.addWidget(self.classify_btn)
 
+        preview_layout = QHBoxLayout()
+        self.preview_btn = QPushButton('Preview (Dry Run)', self)
+        self.preview_btn.setToolTip('Classify a sample spread over extensions and name groups and estimate the '
+                                    'match rate and run time, without copying or moving anything')
+        self.preview_btn.clicked.connect(self.preview_classification)
+        preview_layout.addWidget(self.preview_btn)
+        preview_layout.addWidget(QLabel('Sample size:', self))
+        self.preview_size_spinbox = QSpinBox(self)
+        self.preview_size_spinbox.setRange(10, 5000)
+        self.preview_size_spinbox.setValue(200)
+        preview_layout.addWidget(self.preview_size_spinbox)
+        preview_layout.addStretch()
+        layout.addLayout(preview_layout)
+
         result_layout = QHBoxLayout()
         layout.addLayout(result_layout)
 
-        self.result_list = QListWidget(self)
+        # Status messages keep the newest 100000 rows; copied files are all kept for undo
+        self.result_model = MessageListModel(max_rows=100000, parent=self)
+        self.result_delegate = ButtonItemDelegate('+', self)
+        self.result_delegate.button_clicked.connect(self.manual_add_to_destination)
+        self.result_list = QListView(self)
+        self.result_list.setModel(self.result_model)
+        self.result_list.setItemDelegate(self.result_delegate)
+        self.result_list.setUniformItemSizes(True)
         result_layout.addWidget(self.result_list)
 
-        self.copied_files_list = QListWidget(self)
-        self.copied_files_list.setSelectionMode(QListWidget.NoSelection)
+        self.copied_files_model = MessageListModel(parent=self)
+        self.copied_files_delegate = ButtonItemDelegate('-', self)
+        self.copied_files_delegate.button_clicked.connect(self.undo_action)
+        self.copied_files_list = QListView(self)
+        self.copied_files_list.setModel(self.copied_files_model)
+        self.copied_files_list.setItemDelegate(self.copied_files_delegate)
+        self.copied_files_list.setUniformItemSizes(True)
+        self.copied_files_list.setSelectionMode(QListView.ExtendedSelection)
         result_layout.addWidget(self.copied_files_list)
 
+        # Copies and moves are logged on disk, so a run can be reverted in bulk, also after a restart
+        revert_layout = QHBoxLayout()
+        revert_layout.addStretch()
+        self.revert_selected_btn = QPushButton('Revert Selected', self)
+        self.revert_selected_btn.clicked.connect(self.revert_selected)
+        revert_layout.addWidget(self.revert_selected_btn)
+        self.revert_run_btn = QPushButton('Revert Run', self)
+        self.revert_run_btn.setToolTip('Undo every copy and move of the last classification')
+        self.revert_run_btn.clicked.connect(self.revert_run)
+        revert_layout.addWidget(self.revert_run_btn)
+        self.revert_log_btn = QPushButton('Revert Past Run...', self)
+        self.revert_log_btn.setToolTip('Pick a logged run from an earlier session and undo its copies and moves')
+        self.revert_log_btn.clicked.connect(self.revert_past_run)
+        revert_layout.addWidget(self.revert_log_btn)
+        layout.addLayout(revert_layout)
+
+        # Thread signals are buffered and applied to the lists in one go every 100 ms
+        self.pending_status_rows = []
+        self.pending_copied_rows = []
+        self.pending_progress = None
+        self.ui_update_timer = QTimer(self)
+        self.ui_update_timer.setInterval(100)
+        self.ui_update_timer.timeout.connect(self.flush_ui_updates)
+
         self.status_label = QLabel('Ready', self)
         layout.addWidget(self.status_label)
 
@@ -336,32 +587,36 @@ class ImageClassifierApp(QMainWindow):
         else:
             self.start_classification()  # Start classification if not running
 
-    def start_classification(self):
-        # Create a QMessageBox with custom buttons for "Move" and "Copy"
-        msg_box = QMessageBox()
-        msg_box.setWindowTitle("Copy or Move")
-        msg_box.setText("Would you like to Copy the files or Move them?")
-        copy_button = msg_box.addButton("Copy", QMessageBox.ActionRole)
-        move_button = msg_box.addButton("Move", QMessageBox.ActionRole)
-        msg_box.exec_()
-        
-        if msg_box.clickedButton() == copy_button:
-            self.move_files = False  # Set to copy files
-        elif msg_box.clickedButton() == move_button:
-            self.move_files = True  # Set to move files
+    def preview_classification(self):
+        if not self.is_classification_running:
+            self.start_classification(preview=True)
+
+    def start_classification(self, preview=False):
+        if preview:
+            self.move_files = False  # A preview never touches the files
+        else:
+            # Create a QMessageBox with custom buttons for "Move" and "Copy"
+            msg_box = QMessageBox()
+            msg_box.setWindowTitle("Copy or Move")
+            msg_box.setText("Would you like to Copy the files or Move them?")
+            copy_button = msg_box.addButton("Copy", QMessageBox.ActionRole)
+            move_button = msg_box.addButton("Move", QMessageBox.ActionRole)
+            msg_box.exec_()
+
+            if msg_box.clickedButton() == copy_button:
+                self.move_files = False  # Set to copy files
+            elif msg_box.clickedButton() == move_button:
+                self.move_files = True  # Set to move files
 
         self.classify_btn.setText('End Classification')  # Change button text
-        self.status_label.setText("Classification started...")
+        self.status_label.setText("Preview started..." if preview else "Classification started...")
         
         # Ensure that both result_list and copied_files_list are fully cleared
-        self.result_list.clear() 
-        self.copied_files_list.clear() 
-
-        # Update the file extensions from the source folder
-        self.update_file_extensions()
+        self.clear_result_lists()
 
         # Reset any internal tracking for processing files to avoid conflicts
         self.copied_files = {} 
+        self.copied_names = set()
         self.processing_files = {}  # Reset the dictionary tracking processing files
 
         # Get selected extensions from the checkboxes
@@ -374,11 +629,24 @@ class ImageClassifierApp(QMainWindow):
         # Update classification key from input field
         self.classification_key = self.classification_key_input.text()
 
+        category_destinations = self.get_category_destinations()
+        if self.routing_checkbox.isChecked():
+            # Ensure at least one category is configured
+            if not category_destinations:
+                QMessageBox.warning(self, "Warning", "Please add at least one category and destination folder.")
+                return
         # Ensure a classification key is provided
-        if not self.classification_key:
+        elif not self.classification_key:
             QMessageBox.warning(self, "Warning", "Please enter a classification key.")
             return
 
+        # The server field is free text; a malformed URL is reported here instead of by the thread
+        try:
+            client = OllamaClient(self.servers_input.text(), pool_size=self.concurrency_spinbox.value())
+        except OllamaError as e:
+            QMessageBox.warning(self, "Warning", str(e))
+            return
+
         # Start timer
         self.start_time = time.time()
         self.timer.start(1000)
@@ -392,53 +660,143 @@ class ImageClassifierApp(QMainWindow):
         # Set flag indicating classification is running
         self.is_classification_running = True  
 
+        # Open the result cache lazily so runs without it never touch the disk
+        cache = None
+        if self.use_cache_checkbox.isChecked():
+            if self.classification_cache is None:
+                self.classification_cache = ClassificationCache()
+            cache = self.classification_cache
+
         # Start the classification thread
         self.thread = ClassificationThread(
             self.source_folder, self.destination_folder, self.classification_key, 
             self.level, self.move_files, self.selected_model, selected_extensions,
-            custom_prompt=self.custom_prompt
+            custom_prompt=self.custom_prompt,
+            max_in_flight=self.concurrency_spinbox.value(),
+            client=client,
+            cache=cache,
+            batch_size=self.batch_size_spinbox.value(),
+            category_destinations=category_destinations,
+            recursive=self.recursive_checkbox.isChecked(),
+            prefilter_model=self.prefilter_model_input.text().strip() if self.prefilter_checkbox.isChecked() else None,
+            resumable=self.resume_checkbox.isChecked(),
+            answer_retries=1 if self.retry_answers_checkbox.isChecked() else 0,
+            dedupe_content=self.dedupe_checkbox.isChecked(),
+            skip_existing_duplicates=self.skip_duplicates_checkbox.isChecked(),
+            vision_model=self.vision_model_input.text().strip() if self.vision_checkbox.isChecked() else None,
+            read_documents=self.read_documents_checkbox.isChecked(),
+            constrained_decisions=self.constrained_checkbox.isChecked(),
+            group_similar_names=self.group_names_checkbox.isChecked(),
+            adaptive_concurrency=self.adaptive_checkbox.isChecked(),
+            order=self.order_combo.currentData(),
+            priority_files=self.priority_files,
+            watch=self.watch_checkbox.isChecked() and not preview,
+            preview_size=self.preview_size_spinbox.value() if preview else 0
         )
         
         # Connect signals for UI updates
-        self.thread.progress_changed.connect(self.progress_bar.setValue)
+        self.thread.progress_changed.connect(self.update_progress)
         self.thread.status_message.connect(self.update_status)
-        self.thread.file_copied.connect(self.update_copied_files)
+        self.thread.file_copied.connect(self.queue_copied_file)
+        self.thread.metrics_changed.connect(self.update_metrics)
+        self.thread.preview_ready.connect(self.show_preview)
         self.thread.finished.connect(self.classification_finished)
+        self.throughput_label.setText('')
+        self.export_report_btn.setEnabled(False)
         
-        # Start the thread
-        self.thread.start()
+        # Start the thread; a watching thread runs for a long time and yields the CPU to the UI
+        self.ui_update_timer.start()
+        self.thread.start(QThread.LowPriority if self.watch_checkbox.isChecked() else QThread.InheritPriority)
 
     def end_classification(self):
-        # Check if the thread is still running, and terminate it
+        # Ask a running thread to stop; it saves its journal so the run can be resumed later.
+        # The window is not blocked while it winds down: classification_finished resets the
+        # UI once the thread has exited.
         if hasattr(self, 'thread') and self.thread.isRunning():
-            self.thread.terminate()  # Terminate the classification thread
-            self.thread.wait()
+            self.thread.cancel()
+            self.classify_btn.setEnabled(False)
+            self.status_label.setText("Ending classification...")
+            return
+        self.reset_after_end()
+
+    def reset_after_end(self):
+        self.timer.stop()
 
         # Reset button text
         self.classify_btn.setText('Start Classification') 
 
         # Reset flags and progress bar
         self.is_classification_running = False 
+        self.ui_update_timer.stop()
         self.progress_bar.setValue(0) 
 
         # Update the status label
         self.status_label.setText("Classification ended.")
 
         # Clear the result_list and copied_files_list to ensure no lingering files
-        self.result_list.clear()  
-        self.copied_files_list.clear()
+        self.clear_result_lists()
 
         # Refresh the file list to prepare for the next classification
         self.update_file_extensions()
 
     def classification_finished(self):
+        self.flush_ui_updates()
+        self.ui_update_timer.stop()
         self.classify_btn.setText('Start Classification')  # Reset button text
         self.is_classification_running = False  # Reset flag
-        self.status_label.setText("Classification completed.")
+        if self.thread.classifier.cancelled:
+            self.classify_btn.setEnabled(True)
+            self.reset_after_end()
+        elif self.thread.preview_size:
+            self.status_label.setText("Preview completed.")
+        else:
+            self.status_label.setText("Classification completed.")
         self.timer.stop()
         elapsed_time = time.time() - self.start_time
         formatted_time = time.strftime('%H:%M:%S', time.gmtime(elapsed_time))
         self.time_label.setText(f'Time taken: {formatted_time}')
+        self.export_report_btn.setEnabled(True)
+
+    def show_preview(self, summary):
+        projected = time.strftime('%H:%M:%S', time.gmtime(summary['projected_seconds']))
+        lines = [f"Sampled {summary['sampled']} of {summary['files']} files ({summary['unclear']} unclear).",
+                 f"Estimated match rate: {summary['match_rate']:.0%} ± {summary['margin']:.0%} "
+                 f"(about {summary['estimated_matches']} files)."]
+        lines += [f"  {category}: about {count} files" for category, count in summary['categories'].items()]
+        lines.append(f"Projected run time with these settings: {projected}.")
+        lines.append("The sampled decisions are listed in the results.")
+        QMessageBox.information(self, "Preview", "\n".join(lines))
+
+    def select_priority_files(self):
+        if not getattr(self, 'source_folder', None):
+            QMessageBox.warning(self, "Warning", "Please select a source folder first.")
+            return
+        paths, _ = QFileDialog.getOpenFileNames(self, "Files to Process First", self.source_folder)
+        self.priority_files = [os.path.relpath(path, self.source_folder) for path in paths]
+        self.priority_files_label.setText(f"{len(self.priority_files)} files first" if self.priority_files else '')
+
+    def update_metrics(self, snapshot):
+        text = f"{snapshot['files_per_second']:.1f} files/s"
+        if snapshot['eta_seconds'] is not None and snapshot['processed'] < snapshot['total']:
+            text += f" | ETA {time.strftime('%H:%M:%S', time.gmtime(snapshot['eta_seconds']))}"
+        gauges = snapshot.get('gauges', {})
+        if 'concurrency_limit' in gauges:
+            text += (f" | {gauges['in_flight']}/{gauges['concurrency_limit']} requests in flight, "
+                     f"{gauges['queue_depth']} files queued")
+        self.throughput_label.setText(text)
+
+    def export_run_report(self):
+        if not hasattr(self, 'thread'):
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export Run Report", "run_report.json",
+                                              "JSON (*.json);;CSV (*.csv);;Prometheus text (*.prom)")
+        if not path:
+            return
+        try:
+            self.thread.classifier.metrics.write_report(path)
+            self.status_label.setText(f"Run report saved to {path}")
+        except OSError as e:
+            QMessageBox.warning(self, "Warning", f"Could not save the run report: {e}")
 
     def toggle_prompt_mode(self):
         if self.is_using_custom_prompt:
@@ -455,10 +813,46 @@ class ImageClassifierApp(QMainWindow):
             self.classification_key_input.setVisible(False)
             self.is_using_custom_prompt = True
 
+    def toggle_routing_mode(self, enabled):
+        self.routing_group_box.setVisible(enabled)
+        self.classification_key_input.setEnabled(not enabled)
+        self.dest_btn.setEnabled(not enabled)
+
+    def add_category(self):
+        category, ok = QInputDialog.getText(self, "Add Category", "Category name:")
+        category = category.strip()
+        if not ok or not category:
+            return
+        folder = QFileDialog.getExistingDirectory(self, f"Select Destination Folder for '{category}'")
+        if not folder:
+            return
+
+        row = self.category_table.rowCount()
+        self.category_table.insertRow(row)
+        self.category_table.setItem(row, 0, QTableWidgetItem(category))
+        self.category_table.setItem(row, 1, QTableWidgetItem(folder))
+
+    def remove_category(self):
+        for row in sorted({index.row() for index in self.category_table.selectedIndexes()}, reverse=True):
+            self.category_table.removeRow(row)
+
+    def get_category_destinations(self):
+        if not self.routing_checkbox.isChecked():
+            return {}
+        category_destinations = {}
+        for row in range(self.category_table.rowCount()):
+            category = self.category_table.item(row, 0).text().strip()
+            folder = self.category_table.item(row, 1).text().strip()
+            if category and folder:
+                category_destinations[category] = folder
+        return category_destinations
+
     def select_source(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Source Folder")
         if folder:
             self.source_folder = folder
+            self.priority_files = []
+            self.priority_files_label.setText('')
             self.source_path_label.setText(f"Selected Source: {folder}")
             self.status_label.setText(f"Source: {folder}")
             self.update_file_extensions()
@@ -471,11 +865,22 @@ class ImageClassifierApp(QMainWindow):
             self.status_label.setText(f"Destination: {folder}")
 
     def update_file_extensions(self):
-        self.file_extensions = set()
-        for file in os.listdir(self.source_folder):
-            ext = os.path.splitext(file)[1].lower()
-            if ext and ext not in self.system_extensions:
-                self.file_extensions.add(ext)
+        # Scanning runs in the background so large or remote folders never freeze the window
+        if not self.source_folder:
+            return
+        # Parented to the window so a superseded scan can finish without being destroyed mid-run
+        self.extension_scan_thread = ExtensionScanThread(self.source_folder, self.recursive_checkbox.isChecked(), parent=self)
+        self.extension_scan_thread.extensions_found.connect(self.set_file_extensions)
+        self.extension_scan_thread.finished.connect(self.extension_scan_thread.deleteLater)
+        self.extension_scan_thread.start()
+
+    def set_file_extensions(self, extensions):
+        # Ignore results from a scan that was superseded by a newer one
+        if self.sender() is not self.extension_scan_thread:
+            return
+        # Keep the user's unchecked extensions unchecked across rescans
+        unchecked = {cb.text() for cb in self.extension_checkboxes if not cb.isChecked()}
+        self.file_extensions = {ext for ext in extensions if ext not in self.system_extensions}
 
         for checkbox in self.extension_checkboxes:
             self.extension_layout.removeWidget(checkbox)
@@ -484,79 +889,164 @@ class ImageClassifierApp(QMainWindow):
 
         for ext in sorted(self.file_extensions):
             checkbox = QCheckBox(ext)
-            checkbox.setChecked(True)
+            checkbox.setChecked(ext not in unchecked)
             self.extension_checkboxes.append(checkbox)
             self.extension_layout.addWidget(checkbox)
 
+    def update_progress(self, value):
+        if self.is_classification_running:
+            self.pending_progress = value
+
     def update_status(self, message):
-        file_name = message.split(": ")[-1]
-        self.add_processing_file(file_name, message)
-
-    def add_processing_file(self, file_name, status_message):
-        already_added = file_name in self.copied_files
-        item_widget = ProcessingItemWidget(status_message, show_add_button=not already_added)
-        list_item = QListWidgetItem()
-        list_item.setSizeHint(item_widget.sizeHint())
-        
-        self.result_list.addItem(list_item)
-        self.result_list.setItemWidget(list_item, item_widget)
-        item_widget.label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        if self.is_classification_running:
+            self.pending_status_rows.append(message)
 
-        if not already_added:
-            item_widget.add_button.clicked.connect(lambda: self.manual_add_to_destination(file_name, list_item))
+    def queue_copied_file(self, file_name, action, dest_path):
+        if self.is_classification_running:
+            self.pending_copied_rows.append((file_name, action, dest_path))
+
+    def flush_ui_updates(self):
+        # Applies everything the thread reported since the last tick as one model update per list
+        if self.pending_copied_rows:
+            for file_name, action, dest_path in self.pending_copied_rows:
+                self.record_copied_file(file_name, action, dest_path)
+            self.copied_files_model.append_rows([(file_name, dest_path, True) for file_name, _, dest_path in self.pending_copied_rows])
+            self.pending_copied_rows = []
+
+        if self.pending_status_rows:
+            rows = []
+            for message in self.pending_status_rows:
+                file_name = message.split(": ")[-1]
+                rows.append((message, file_name, file_name not in self.copied_names))
+            self.result_model.append_rows(rows)
+            self.pending_status_rows = []
+
+        if self.pending_progress is not None:
+            self.progress_bar.setValue(self.pending_progress)
+            self.pending_progress = None
+
+    def clear_result_lists(self):
+        self.pending_status_rows = []
+        self.pending_copied_rows = []
+        self.pending_progress = None
+        self.result_model.clear()
+        self.copied_files_model.clear()
+
+    def manual_add_to_destination(self, row):
+        if not self.destination_folder:
+            QMessageBox.warning(self, "Warning", "Please select a destination folder to add files manually.")
+            return
 
-    def manual_add_to_destination(self, file_name, list_item):
+        # Goes through the classifier so the name is checked for collisions and the transfer is logged
+        classifier = self.thread.classifier
+        file_name = self.result_model.index(row).data(FileNameRole)
         source_path = os.path.join(self.source_folder, file_name)
-        dest_path = os.path.join(self.destination_folder, file_name)
-
-        if self.move_files:
-            shutil.move(source_path, dest_path)
-            action = 'moved'
-        else:
-            shutil.copy(source_path, dest_path)
-            action = 'copied'
-
-        self.update_copied_files(file_name, action)
-        self.result_list.takeItem(self.result_list.row(list_item))
-
-    def update_copied_files(self, file_name, action):
-        item_widget = FileItemWidget(file_name)
-        list_item = QListWidgetItem(self.copied_files_list)
-        list_item.setSizeHint(item_widget.sizeHint())
-        self.copied_files_list.addItem(list_item)
-        self.copied_files_list.setItemWidget(list_item, item_widget)
+        try:
+            dest_path = classifier.move_or_copy_file(source_path, os.path.join(self.destination_folder, os.path.basename(file_name)))
+        except OSError as e:
+            self.status_label.setText(f"Error adding {file_name}: {e}")
+            return
+        if dest_path is None:
+            self.status_label.setText(f"Identical file already in destination, skipped: {file_name}")
+            return
 
-        item_widget.undo_button.clicked.connect(lambda: self.undo_action(file_name, list_item))
-        item_widget.label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        action = 'moved' if classifier.move_files else 'copied'
+        if classifier.operation_log is not None:
+            classifier.operation_log.record(action, source_path, dest_path)
+        self.update_copied_files(file_name, action, dest_path)
+        self.result_model.remove_row(row)
+
+    def update_copied_files(self, file_name, action, dest_path):
+        self.record_copied_file(file_name, action, dest_path)
+        self.copied_files_model.append_rows([(file_name, dest_path, True)])
+
+    def record_copied_file(self, file_name, action, dest_path):
+        # Keyed by destination: the same name can land in a folder more than once ("name_1.jpg")
+        self.copied_files[dest_path] = file_name
+        self.copied_names.add(file_name)
+
+    def current_operation_log(self):
+        return self.thread.classifier.operation_log if hasattr(self, 'thread') else None
+
+    def undo_action(self, row):
+        dest_path = self.copied_files_model.index(row).data(FileNameRole)
+        file_name = self.copied_files.get(dest_path)
+        operation_log = self.current_operation_log()
+        if file_name is None or operation_log is None:
+            return
 
-        source_path = os.path.join(self.source_folder, file_name)
-        dest_path = os.path.join(self.destination_folder, file_name)
-        self.copied_files[file_name] = {
-            'source': source_path,
-            'destination': dest_path,
-            'action': action
-        }
+        entry = operation_log.operations.get(os.path.abspath(dest_path))
+        reverted, errors = operation_log.revert([dest_path])
+        if errors:
+            self.status_label.setText(f"Error reverting {file_name}: {errors[0][1]}")
+            return
+        if entry is not None and entry['action'] == 'moved':
+            self.status_label.setText(f"Moved {file_name} back to source folder.")
+        else:
+            self.status_label.setText(f"Removed {file_name} from destination folder.")
+        self.copied_files_model.remove_row(row)
+        del self.copied_files[dest_path]
+
+    def revert_selected(self):
+        dest_paths = [index.data(FileNameRole) for index in self.copied_files_list.selectionModel().selectedRows()]
+        if not dest_paths or self.current_operation_log() is None:
+            self.status_label.setText("Select copied or moved files in the list to revert them.")
+            return
+        self.start_revert(self.current_operation_log(), dest_paths)
 
-    def undo_action(self, file_name, list_item):
-        file_info = self.copied_files.get(file_name)
-        if not file_info:
+    def revert_run(self):
+        operation_log = self.current_operation_log()
+        if operation_log is None or not operation_log.pending():
+            self.status_label.setText("Nothing to revert.")
             return
+        self.confirm_revert(operation_log)
 
-        if file_info['action'] == 'moved':
-            try:
-                shutil.move(file_info['destination'], file_info['source'])
-                self.status_label.setText(f"Moved {file_name} back to source folder.")
-            except Exception as e:
-                self.status_label.setText(f"Error moving {file_name} back: {str(e)}")
-        elif file_info['action'] == 'copied':
-            try:
-                os.remove(file_info['destination'])
-                self.status_label.setText(f"Removed {file_name} from destination folder.")
-            except Exception as e:
-                self.status_label.setText(f"Error removing {file_name}: {str(e)}")
-
-        self.copied_files_list.takeItem(self.copied_files_list.row(list_item))
-        del self.copied_files[file_name]
+    def revert_past_run(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Revert Past Run", os.path.join(APP_DATA_DIR, 'operations'),
+                                              "Operation logs (*.jsonl)")
+        if not path:
+            return
+        operation_log = self.current_operation_log()
+        if operation_log is None or os.path.abspath(operation_log.path) != os.path.abspath(path):
+            operation_log = OperationLog(path)
+        if not operation_log.pending():
+            self.status_label.setText("Everything in this run has already been reverted.")
+            return
+        self.confirm_revert(operation_log)
+
+    def confirm_revert(self, operation_log):
+        count = len(operation_log.pending())
+        answer = QMessageBox.question(self, "Revert Run", f"Undo {count} copies and moves? Moved files go back to "
+                                      "their original folders and copies are deleted.")
+        if answer == QMessageBox.Yes:
+            self.start_revert(operation_log)
+
+    def start_revert(self, operation_log, dest_paths=None):
+        if self.is_classification_running or (self.revert_thread is not None and self.revert_thread.isRunning()):
+            QMessageBox.warning(self, "Warning", "Wait for the running classification or revert to finish.")
+            return
+        self.revert_thread = RevertThread(operation_log, dest_paths, parent=self)
+        self.revert_thread.progress_changed.connect(self.progress_bar.setValue)
+        self.revert_thread.revert_done.connect(self.revert_finished)
+        self.set_revert_buttons_enabled(False)
+        self.status_label.setText("Reverting...")
+        self.revert_thread.start()
+
+    def revert_finished(self, reverted, errors):
+        self.set_revert_buttons_enabled(True)
+        operation_log = self.current_operation_log()
+        if operation_log is not None:
+            done = {dest_path for dest_path in self.copied_files if os.path.abspath(dest_path) not in operation_log.operations}
+            self.copied_files_model.remove_files(done)
+            for dest_path in done:
+                del self.copied_files[dest_path]
+        self.result_model.append_rows([(f"Error: Could not revert {dest_path}: {error}", dest_path, False)
+                                       for dest_path, error in errors])
+        self.status_label.setText(f"Reverted {reverted} files" + (f", {len(errors)} failed." if errors else "."))
+
+    def set_revert_buttons_enabled(self, enabled):
+        for button in (self.revert_selected_btn, self.revert_run_btn, self.revert_log_btn):
+            button.setEnabled(enabled)
 
     def update_time(self):
         if self.start_time:
@@ -564,19 +1054,52 @@ class ImageClassifierApp(QMainWindow):
             formatted_time = time.strftime('%H:%M:%S', time.gmtime(elapsed_time))
             self.time_label.setText(f'Time taken: {formatted_time}')
 
-    def get_available_models(self):
-        try:
-            response = requests.get('http://localhost:11434/api/tags')
-            if response.status_code == 200:
-                models = json.loads(response.text)['models']
-                return [model['name'] for model in models]
-            else:
-                return ["Error: Unable to fetch models"]
-        except requests.exceptions.RequestException:
-            return ["Error: Cannot connect to Ollama"]
+    def refresh_models(self):
+        # The model list is fetched in the background so the window shows immediately
+        self.model_list_thread = ModelListThread(self.servers_input.text(), parent=self)
+        self.model_list_thread.models_loaded.connect(self.set_available_models)
+        self.model_list_thread.finished.connect(self.model_list_thread.deleteLater)
+        self.model_list_thread.start()
+
+    def set_available_models(self, models):
+        # Ignore results from a listing that was superseded by a newer one
+        if self.sender() is not self.model_list_thread:
+            return
+        # Keep the current model selected if the server has it, otherwise use the first one
+        self.model_selector.blockSignals(True)
+        self.model_selector.clear()
+        self.model_selector.addItems(models)
+        if self.selected_model in models:
+            self.model_selector.setCurrentText(self.selected_model)
+        self.model_selector.blockSignals(False)
+        if self.selected_model not in models and models and not models[0].startswith('Error:'):
+            self.update_selected_model(models[0])
+        elif self.selected_model in models:
+            self.warmup_timer.start()
 
     def update_selected_model(self, model):
         self.selected_model = model
+        self.warmup_timer.start()
+
+    def warm_up_model(self):
+        model = self.selected_model
+        # A running classification loads the model itself; placeholder entries are not models
+        if self.is_classification_running or not model or model.startswith(('Error:', 'Loading')):
+            return
+        self.model_warmup_thread = ModelWarmupThread(self.servers_input.text(), model, parent=self)
+        self.model_warmup_thread.warmed.connect(self.model_warmed)
+        self.model_warmup_thread.finished.connect(self.model_warmup_thread.deleteLater)
+        self.model_warmup_thread.start()
+        self.status_label.setText(f"Loading model {model}...")
+
+    def model_warmed(self, model, seconds, error):
+        # Only the latest warm-up reports, and never over the messages of a run
+        if self.sender() is not self.model_warmup_thread or self.is_classification_running:
+            return
+        if error:
+            self.status_label.setText(f"Could not load model {model}: {error}")
+        else:
+            self.status_label.setText(f"Model {model} loaded in {seconds:.1f}s")
 
     def update_level_label(self, value):
         level_dict = {
@@ -599,28 +1122,15 @@ class ImageClassifierApp(QMainWindow):
         if not classification_key:
             classification_key = "{The Inputted classification key}"
         
-        # If no file name has been processed yet, use a placeholder
-        file_name_without_extension = "File Name"
-
-        level_prompts = {
-            0: f"Could '{file_name_without_extension}' be considered related to '{classification_key}'? Consider even weak or indirect connections.",
-            1: f"Could '{file_name_without_extension}' be loosely associated with the concept or category of '{classification_key}'? Consider even indirect or weak associations.",
-            2: f"Could '{file_name_without_extension}' be loosely associated with the concept or category of '{classification_key}'?",
-            3: f"Would you say that '{file_name_without_extension}' is somewhat related to the concept or category of '{classification_key}'? This includes partial or tangential relationships.",
-            4: f"Would you say that '{file_name_without_extension}' is somewhat related to the concept or category of '{classification_key}'?",  # New prompt for level 4
-            5: f"Can '{file_name_without_extension}' be categorized as '{classification_key}'? Focus on whether this fits under that category.",
-            6: f"Does '{file_name_without_extension}' have a clear and direct connection to the concept or category of '{classification_key}'? Focus on explicit and obvious relationships.",
-            7: f"Is '{file_name_without_extension}' strongly related to the concept or category of '{classification_key}'? This should be a significant and apparent connection.",
-            8: f"Does '{file_name_without_extension}' specifically and explicitly represent the concept or category of '{classification_key}'?"
-        }
-
-        selected_prompt = level_prompts[self.level_slider.value()]
-        self.prompt_label.setText(f"The Used Prompt: {selected_prompt}")
+        # Same instruction the classifier sends; each request adds only the file name after it
+        selected_prompt = name_instruction(classification_key, self.level_slider.value())
+        self.prompt_label.setText(f"The Used Prompt: {selected_prompt} File name: ...")
 
 if __name__ == '__main__':
     print("Starting application...")
     app = QApplication(sys.argv)
     ex = ImageClassifierApp()
     ex.show()
-    print("Application running...")
+    # Runs once the event loop has painted the window
+    QTimer.singleShot(0, lambda: print(f"Application running, window shown after {time.perf_counter() - STARTUP_TIME:.2f}s"))
     sys.exit(app.exec_())
@@ -0,0 +1,168 @@
+import re
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the parts of the Ollama API the app uses (/v1/chat/completions,
+# /api/embed and /api/tags), with configurable latency, jitter, error rate and a
+# concurrency limit, so throughput can be measured without a real model.
+#   python benchmarks/mock_ollama_server.py --port 11500 --latency 0.2 --parallel 4
+
+
+def stable_fraction(text):
+    # Deterministic value in [0, 1) so repeated runs give the same answers
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16) / 0x100000000
+
+
+# MockOllamaServer Class
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, jitter=0.0, error_rate=0.0, parallel=4, match_rate=0.3,
+                 models=('mistral:latest', 'llava:latest', 'nomic-embed-text:latest')):
+        super().__init__(('127.0.0.1', port), MockOllamaHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.match_rate = match_rate
+        self.models = list(models)
+        # Requests beyond the limit wait for a free slot, like OLLAMA_NUM_PARALLEL
+        self.slots = threading.BoundedSemaphore(max(1, parallel))
+        self.request_count = 0
+        self.count_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def simulate_work(self):
+        with self.count_lock:
+            self.request_count += 1
+        with self.slots:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        return random.random() >= self.error_rate
+
+    def answer_for(self, name, categories=None):
+        fraction = stable_fraction(name)
+        if fraction >= self.match_rate:
+            return 'none' if categories else 'no'
+        if categories:
+            return categories[int(fraction / self.match_rate * len(categories)) % len(categories)]
+        return 'yes'
+
+
+# MockOllamaHandler Class
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real server
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.send_json(200, {'models': [{'name': name} for name in self.server.models]})
+        elif self.path == '/v1/models':
+            self.send_json(200, {'object': 'list', 'data': [{'id': name, 'object': 'model'} for name in self.server.models]})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.server.simulate_work():
+            self.send_json(503, {'error': 'simulated failure'})
+            return
+
+        if self.path == '/api/embed':
+            inputs = request.get('input', [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.send_json(200, {'embeddings': [self.embedding(text) for text in inputs]})
+        elif self.path == '/v1/embeddings':
+            inputs = request.get('input', [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.send_json(200, {'data': [{'index': index, 'embedding': self.embedding(text)} for index, text in enumerate(inputs)]})
+        elif self.path == '/v1/chat/completions':
+            answer = reply = self.chat_reply(request)
+            schema = ((request.get('response_format') or {}).get('json_schema') or {}).get('schema') or {}
+            if 'answer' in schema.get('properties', {}):
+                reply = json.dumps({'answer': answer})  # Constrained single decision
+            choice = {'message': {'role': 'assistant', 'content': reply}}
+            if request.get('logprobs') and answer in ('yes', 'no'):
+                probability = 0.95 if answer == 'yes' else 0.05
+                choice['logprobs'] = {'content': [{'token': answer, 'logprob': math.log(max(probability, 1 - probability)),
+                                                   'top_logprobs': [{'token': 'yes', 'logprob': math.log(probability)},
+                                                                    {'token': 'no', 'logprob': math.log(1 - probability)}]}]}
+            self.send_json(200, {'choices': [choice]})
+        elif self.path in ('/api/generate', '/api/chat'):
+            self.send_json(200, {'done': True})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def embedding(self, text):
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return [byte / 255.0 - 0.5 for byte in digest[:16]]
+
+    def chat_reply(self, request):
+        # The system message holds the instructions, the last message the file name(s) or image
+        content = request['messages'][-1]['content']
+        if isinstance(content, list):
+            # Vision request: answer from the image bytes
+            return self.server.answer_for(json.dumps(content)[-64:])
+
+        instructions = " ".join(message['content'] for message in request['messages']
+                                if message.get('role') == 'system' and isinstance(message.get('content'), str))
+        category_list = re.search(r"category from (.+?) that", instructions)
+        categories = re.findall(r"'([^']+)'", category_list.group(1)) if category_list else None
+        numbered = re.findall(r'^(\d+)\. (.+)$', content, re.MULTILINE)
+        if numbered:
+            answers = [{'index': int(number), 'answer': self.server.answer_for(name, categories)} for number, name in numbered]
+            return json.dumps({'answers': answers})
+        name = re.search(r'^File name: (.+)$', content, re.MULTILINE)
+        return self.server.answer_for(name.group(1) if name else content, categories)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server for benchmarks.")
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Uniform +/- seconds added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument('--parallel', type=int, default=4, help="Requests processed at once; the rest wait")
+    parser.add_argument('--match-rate', type=float, default=0.3, help="Fraction of names answered 'yes'")
+    args = parser.parse_args(argv)
+
+    server = MockOllamaServer(args.port, args.latency, args.jitter, args.error_rate, args.parallel, args.match_rate)
+    print(f"Mock Ollama listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_filter_core import FileClassifier  # noqa: E402
+from ollama_client import OllamaClient  # noqa: E402
+from mock_ollama_server import MockOllamaServer  # noqa: E402
+from synthetic_folders import generate_folder  # noqa: E402
+
+# Scripted throughput runs of FileClassifier against the mock server. Each scenario copies
+# (or moves) a synthetic folder into a fresh destination and reports files/sec, p50/p99
+# per-file latency, peak RSS and the time spent in copy/move. Every scenario runs in its own
+# process so peak RSS is that scenario's alone rather than the highest so far.
+#   python benchmarks/run_benchmark.py --files 10000 --latency 0.02 --parallel 4
+
+# (name, max_in_flight, batch_size) combinations run by default
+DEFAULT_SCENARIOS = [
+    ('serial', 1, 1),
+    ('concurrent-4', 4, 1),
+    ('concurrent-8', 8, 1),
+    ('batched-4x10', 4, 10)
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def peak_rss_megabytes():
+    try:
+        import resource
+    except ImportError:
+        return None  # Not available on Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+# BenchmarkClassifier Class
+class BenchmarkClassifier(FileClassifier):
+    # Records when each file is handed to the request pool and when its result is handled
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted_at = {}
+        self.latencies = []
+
+    def submit_classification(self, executor, batch):
+        now = time.perf_counter()
+        for _, file_name in batch:
+            self.submitted_at[file_name] = now
+        return super().submit_classification(executor, batch)
+
+    def handle_classification_result(self, index, file_name, is_match):
+        super().handle_classification_result(index, file_name, is_match)
+        submitted_at = self.submitted_at.pop(file_name, None)
+        if submitted_at is not None:
+            self.latencies.append(time.perf_counter() - submitted_at)
+
+
+def run_scenario(name, source_folder, base_url, max_in_flight, batch_size, move_files, extensions):
+    destination_folder = tempfile.mkdtemp(prefix=f'bench_{name}_')
+    client = OllamaClient(base_url, pool_size=max_in_flight, retries=3, backoff=0.05)
+    classifier = BenchmarkClassifier(
+        source_folder, destination_folder, 'cats', 2, move_files, 'mistral:latest', extensions,
+        max_in_flight=max_in_flight, batch_size=batch_size, client=client,
+        operation_log=None  # The destination is deleted below; nothing to revert later
+    )
+    start = time.perf_counter()
+    classifier.run()
+    elapsed = time.perf_counter() - start
+    client.close()
+
+    files = len(classifier.latencies)
+    result = {
+        'scenario': name,
+        'max_in_flight': max_in_flight,
+        'batch_size': batch_size,
+        'files': files,
+        'seconds': round(elapsed, 3),
+        'files_per_second': round(files / elapsed, 1) if elapsed else 0.0,
+        'p50_latency_ms': round(percentile(classifier.latencies, 0.50) * 1000, 1),
+        'p99_latency_ms': round(percentile(classifier.latencies, 0.99) * 1000, 1),
+        'transfer_seconds': round(classifier.metrics.snapshot()['stages'].get('transfer', {}).get('total_seconds', 0.0), 3),
+        'peak_rss_mb': peak_rss_megabytes()
+    }
+    shutil.rmtree(destination_folder, ignore_errors=True)
+    return result
+
+
+def print_table(results):
+    columns = ['scenario', 'files', 'seconds', 'files_per_second', 'p50_latency_ms', 'p99_latency_ms',
+               'transfer_seconds', 'peak_rss_mb']
+    widths = {column: max(len(column), *(len(f"{result[column]}") for result in results)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]}".ljust(widths[column]) for column in columns).rstrip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the classification pipeline against a mock Ollama server.")
+    parser.add_argument('--files', type=int, default=10000, help="Size of the synthetic folder (e.g. 10000, 100000)")
+    parser.add_argument('--source', default=None, help="Use an existing folder instead of generating one")
+    parser.add_argument('--latency', type=float, default=0.01, help="Mock seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Mock latency jitter in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Mock fraction of failed requests")
+    parser.add_argument('--parallel', type=int, default=4, help="Mock concurrency limit")
+    parser.add_argument('--scenario', action='append', default=None, metavar='NAME:IN_FLIGHT:BATCH',
+                        help="Custom scenario, repeatable (default: serial, concurrent-4, concurrent-8, batched-4x10)")
+    parser.add_argument('--move', action='store_true',
+                        help="Move files; each scenario gets its own fresh folder (a copy of --source if given)")
+    parser.add_argument('--json', default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    scenarios = DEFAULT_SCENARIOS
+    if args.scenario:
+        scenarios = [(name, int(in_flight), int(batch)) for name, in_flight, batch in
+                     (value.split(':') for value in args.scenario)]
+
+    server = MockOllamaServer(0, args.latency, args.jitter, args.error_rate, args.parallel).start()
+    work_folder = tempfile.mkdtemp(prefix='bench_source_')
+    extensions = ['.jpg', '.jpeg', '.png', '.gif', '.mp4', '.pdf', '.txt', '.docx']
+    results = []
+    try:
+        for name, max_in_flight, batch_size in scenarios:
+            source_folder = args.source
+            if source_folder is None:
+                source_folder = os.path.join(work_folder, name)
+                generate_folder(source_folder, args.files)
+            elif args.move:
+                # Moving empties the source, so never move out of the user's folder itself
+                source_folder = os.path.join(work_folder, name)
+                shutil.copytree(args.source, source_folder)
+            # A fresh spawned process per scenario, so ru_maxrss is not carried over between runs
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context('spawn')) as process:
+                results.append(process.submit(run_scenario, name, source_folder, server.base_url, max_in_flight,
+                                              batch_size, args.move, extensions).result())
+            shutil.rmtree(os.path.join(work_folder, name), ignore_errors=True)
+            print(f"{name}: {results[-1]['files_per_second']} files/sec", file=sys.stderr)
+    finally:
+        server.stop()
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as report_file:
+            json.dump({'settings': vars(args), 'results': results}, report_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
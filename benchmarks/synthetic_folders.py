@@ -0,0 +1,76 @@
+import os
+import sys
+import random
+import argparse
+
+# Builds source folders that look like real collections: mixed extensions, camera-style
+# and descriptive names, "(1)"/"(2)" duplicate suffixes and optional byte-identical copies.
+#   python benchmarks/synthetic_folders.py /tmp/bench_10k --files 10000
+
+EXTENSIONS = ['.jpg', '.jpg', '.jpg', '.png', '.jpeg', '.gif', '.mp4', '.pdf', '.txt', '.docx']
+WORDS = ['cat', 'dog', 'beach', 'sunset', 'invoice', 'report', 'trip', 'paris', 'birthday', 'receipt',
+         'mountain', 'family', 'car', 'garden', 'screenshot', 'scan', 'final', 'draft', 'summer', 'wedding']
+
+
+def synthetic_name(rng, index):
+    style = rng.random()
+    if style < 0.3:
+        return f"IMG_{index:05d}"
+    if style < 0.5:
+        return f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{index:04d}"
+    return " ".join(rng.sample(WORDS, rng.randint(1, 3))) + f" {index}"
+
+
+def generate_folder(folder, files=10000, duplicate_suffix_rate=0.1, identical_copy_rate=0.05,
+                    file_size=2048, subfolders=0, seed=1234):
+    # Returns the number of files written
+    rng = random.Random(seed)
+    folders = [folder] + [os.path.join(folder, f"sub_{number}") for number in range(subfolders)]
+    for path in folders:
+        os.makedirs(path, exist_ok=True)
+
+    written = 0
+    previous = None
+    previous_content = None
+    while written < files:
+        target_folder = rng.choice(folders)
+        if previous is not None and rng.random() < duplicate_suffix_rate:
+            # "photo (1).jpg" style duplicate of the previous name
+            base, ext = previous
+            name = f"{base} ({rng.randint(1, 9)}){ext}"
+        else:
+            base, ext = synthetic_name(rng, written), rng.choice(EXTENSIONS)
+            name = f"{base}{ext}"
+            previous = (base, ext)
+
+        path = os.path.join(target_folder, name)
+        if os.path.exists(path):
+            continue
+        if previous_content is not None and rng.random() < identical_copy_rate:
+            # Byte-identical copy under a different name
+            content = previous_content
+        else:
+            content = rng.randbytes(file_size)
+        with open(path, 'wb') as output_file:
+            output_file.write(content)
+        previous_content = content
+        written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic source folder for benchmarks.")
+    parser.add_argument('folder')
+    parser.add_argument('--files', type=int, default=10000, help="Number of files, e.g. 10000 or 100000")
+    parser.add_argument('--file-size', type=int, default=2048, help="Bytes per file")
+    parser.add_argument('--subfolders', type=int, default=0, help="Spread files over this many subfolders")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    count = generate_folder(args.folder, args.files, file_size=args.file_size, subfolders=args.subfolders, seed=args.seed)
+    print(f"Wrote {count} files to {args.folder}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+
+from file_filter_core import FILE_ORDERS, ClassificationCache, FileClassifier, OperationLog, operation_logs
+from ollama_client import DEFAULT_BASE_URL, OllamaClient, OllamaError
+
+# Headless entry point for batch jobs (cron, servers). Progress is streamed to stdout as
+# JSON lines so other tools can follow a run:
+#   python file_filter_cli.py --source in --destination out --key cats --extensions .jpg,.png
+
+
+def parse_category(value):
+    category, separator, folder = value.partition('=')
+    if not separator or not category.strip() or not folder.strip():
+        raise argparse.ArgumentTypeError(f"expected CATEGORY=FOLDER, got '{value}'")
+    return category.strip(), folder.strip()
+
+
+def parse_extensions(value):
+    return [ext if ext.startswith('.') else f'.{ext}' for ext in (part.strip().lower() for part in value.split(',')) if ext]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Sort files into folders with a local Ollama model, without the GUI.")
+    parser.add_argument('--source', help="Folder containing the files to classify")
+    parser.add_argument('--destination', default='', help="Folder receiving matching files")
+    parser.add_argument('--key', default='', help="Classification key, e.g. 'cats'")
+    parser.add_argument('--category', action='append', type=parse_category, default=[], metavar='CATEGORY=FOLDER',
+                        help="Route files into several categories in one pass (repeatable, replaces --key/--destination)")
+    parser.add_argument('--level', type=int, default=2, choices=range(0, 9), metavar='0-8', help="Relevance level (default: 2)")
+    parser.add_argument('--model', default='mistral:latest', help="Ollama model (default: mistral:latest)")
+    parser.add_argument('--extensions', type=parse_extensions, help="Comma separated list, e.g. .jpg,.png")
+    parser.add_argument('--custom-prompt', default=None, help="Use a custom prompt instead of the predefined level prompt")
+    parser.add_argument('--concurrency', type=int, default=1, help="Maximum requests in flight (default: 1)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Adjust the requests in flight to the observed latency, with --concurrency as the upper bound")
+    parser.add_argument('--batch-size', type=int, default=1, help="File names per request (default: 1)")
+    parser.add_argument('--move', action='store_true', help="Move files instead of copying them")
+    parser.add_argument('--recursive', action='store_true', help="Include subfolders of the source folder")
+    parser.add_argument('--no-cache', action='store_true', help="Do not read or write the result cache")
+    parser.add_argument('--no-resume', action='store_true', help="Start from scratch instead of resuming an interrupted run")
+    parser.add_argument('--vision-model', default=None, help="Multimodal model (e.g. llava) that judges images by a thumbnail (needs Pillow)")
+    parser.add_argument('--thumbnail-size', type=int, default=512, help="Longest thumbnail side in pixels (default: 512)")
+    parser.add_argument('--read-documents', action='store_true',
+                        help="Add the start of text, CSV, DOCX and PDF files (PDF needs pypdf) to their prompt")
+    parser.add_argument('--snippet-bytes', type=int, default=4096,
+                        help="With --read-documents, how much of each document is read (default: 4096)")
+    parser.add_argument('--dedupe', action='store_true', help="Classify byte-identical files once and reuse the decision")
+    parser.add_argument('--group-names', action='store_true',
+                        help="Classify one file per group of similar names (numbers, dates and camera prefixes ignored)")
+    parser.add_argument('--spot-check', type=int, default=20, metavar='N',
+                        help="With --group-names, still classify every Nth member of a group; 0 disables (default: 20)")
+    parser.add_argument('--skip-existing', action='store_true', help="Do not copy or move files whose content is already in the destination")
+    parser.add_argument('--watch', action='store_true',
+                        help="After the run, keep classifying files that arrive in the source folder until stopped")
+    parser.add_argument('--settle-seconds', type=float, default=2.0,
+                        help="With --watch, how long a new file must stay unchanged before it is picked up (default: 2)")
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help="With --watch, seconds between checks for new files (default: 2)")
+    parser.add_argument('--ollama-url', default=DEFAULT_BASE_URL,
+                        help=f"Inference server, or a comma separated list to spread requests over; prefix "
+                             f"OpenAI-compatible servers with 'openai:' (default: {DEFAULT_BASE_URL})")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Read timeout per request in seconds (default: 120)")
+    parser.add_argument('--keep-alive', default='30m',
+                        help="keep_alive sent with Ollama's native API requests (embeddings), e.g. 30m or -1 for always "
+                             "(default: 30m); chat requests follow the server's OLLAMA_KEEP_ALIVE")
+    parser.add_argument('--retries', type=int, default=2, help="Retries for failed requests (default: 2)")
+    parser.add_argument('--constrained', action='store_true',
+                        help="Limit replies to the valid answers with a JSON schema and a short token cap; decide yes/no by the token logprobs when available")
+    parser.add_argument('--answer-retries', type=int, default=1, help="Re-ask when the reply is neither yes nor no (default: 1)")
+    parser.add_argument('--prefilter-model', default=None, help="Embedding model used to pre-filter names (needs numpy)")
+    parser.add_argument('--prefilter-batch-size', type=int, default=64,
+                        help="File names embedded per pre-filter request, independent of --batch-size (default: 64)")
+    parser.add_argument('--report', default=None, metavar='PATH',
+                        help="Write per-stage timings when the run ends (.json, .csv or .prom for Prometheus text)")
+    parser.add_argument('--order', choices=FILE_ORDERS, default='scan',
+                        help="Process files in folder order (default) or newest/oldest/largest/smallest first")
+    parser.add_argument('--first', action='append', default=[], metavar='FILE',
+                        help="Process this file (relative to --source) before all others; repeatable")
+    parser.add_argument('--preview', type=int, default=0, metavar='N',
+                        help="Dry run: classify a stratified sample of N files, print estimates and exit without touching files")
+    parser.add_argument('--revert', default=None, metavar='LOG',
+                        help="Undo the copies and moves of a logged run ('last' or a file in ~/.ai_file_filter/operations) and exit")
+    return parser
+
+
+# Worker threads report errors too, so whole lines are written under a lock
+output_lock = threading.Lock()
+
+
+def emit_event(event, **fields):
+    line = json.dumps({'event': event, **fields}) + '\n'
+    with output_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.revert:
+        return revert_run(parser, args.revert)
+    if not args.source or not args.extensions:
+        parser.error("--source and --extensions are required")
+    if not os.path.isdir(args.source):
+        parser.error(f"source folder '{args.source}' does not exist")
+    category_destinations = dict(args.category)
+    if not category_destinations and not (args.key or args.custom_prompt):
+        parser.error("either --key, --custom-prompt or at least one --category is required")
+    if not category_destinations and not args.destination:
+        parser.error("--destination is required unless --category is used")
+
+    try:
+        client = OllamaClient(args.ollama_url, pool_size=args.concurrency, read_timeout=args.timeout, retries=args.retries,
+                              keep_alive=args.keep_alive)
+    except OllamaError as e:
+        parser.error(str(e))
+    cache = None if args.no_cache else ClassificationCache()
+    classifier = FileClassifier(
+        args.source, args.destination, args.key, args.level, args.move, args.model, args.extensions,
+        custom_prompt=args.custom_prompt,
+        max_in_flight=args.concurrency,
+        cache=cache,
+        batch_size=args.batch_size,
+        category_destinations=category_destinations,
+        recursive=args.recursive,
+        prefilter_model=args.prefilter_model,
+        prefilter_batch_size=args.prefilter_batch_size,
+        resumable=not args.no_resume,
+        client=client,
+        answer_retries=args.answer_retries,
+        dedupe_content=args.dedupe,
+        skip_existing_duplicates=args.skip_existing,
+        vision_model=args.vision_model,
+        thumbnail_size=args.thumbnail_size,
+        read_documents=args.read_documents,
+        snippet_bytes=args.snippet_bytes,
+        constrained_decisions=args.constrained,
+        group_similar_names=args.group_names,
+        adaptive_concurrency=args.adaptive,
+        spot_check_interval=args.spot_check,
+        order=args.order,
+        priority_files=[os.path.normpath(file_name) for file_name in args.first],
+        progress_callback=lambda percent: emit_event('progress', percent=percent),
+        status_callback=lambda message: emit_event('status', message=message),
+        file_callback=lambda file_name, action, destination_path: emit_event(
+            'file', name=file_name, action=action, destination=destination_path),
+        metrics_callback=lambda snapshot: emit_event('metrics', **snapshot)
+    )
+
+    # Ctrl+C / SIGTERM stop the run cooperatively and save the journal, so the next run resumes
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: classifier.cancel())
+
+    start_time = time.time()
+    if args.preview:
+        summary = classifier.preview(args.preview)
+        if summary is not None:
+            emit_event('preview', **summary)
+    elif args.watch:
+        if hasattr(os, 'nice'):
+            os.nice(10)  # A long-running watcher should not compete with interactive programs
+        classifier.watch(args.settle_seconds, args.poll_interval)
+    else:
+        classifier.run()
+    if args.report:
+        classifier.metrics.write_report(args.report)
+    emit_event('cancelled' if classifier.cancelled else 'finished', elapsed=round(time.time() - start_time, 3))
+    client.close()
+    if cache is not None:
+        cache.close()
+    return 130 if classifier.cancelled else 0
+
+
+def revert_run(parser, log_path):
+    if log_path == 'last':
+        logs = operation_logs()
+        if not logs:
+            parser.error("no logged runs to revert")
+        log_path = logs[0]
+    elif not os.path.isfile(log_path):
+        parser.error(f"operation log '{log_path}' does not exist")
+
+    def report(entry, error):
+        if error is None:
+            emit_event('reverted', source=entry['source'], destination=entry['destination'])
+        else:
+            emit_event('status', message=f"Error: Could not revert {entry['destination']}: {error}")
+
+    operation_log = OperationLog(log_path)
+    start_time = time.time()
+    reverted, errors = operation_log.revert(callback=report)
+    operation_log.close()
+    emit_event('finished', reverted=reverted, failed=len(errors), elapsed=round(time.time() - start_time, 3))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2140 @@
+import os
+import sys
+import io
+import base64
+import shutil
+import json
+import math
+import random
+import time
+import re  # Import regex library
+import errno
+import threading
+import itertools
+import queue
+import hashlib
+import importlib.util
+import concurrent.futures
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from ollama_client import OllamaClient
+from run_metrics import RunMetrics
+
+# Classification pipeline without any Qt dependency, used by "AI File Filter.py" and
+# file_filter_cli.py. requests, numpy, sqlite3 and multiprocessing are imported where they
+# are first needed so importing this module (and opening the window) stays fast.
+
+# Folder used for data that outlives a single run (result cache, etc.)
+APP_DATA_DIR = os.path.join(os.path.expanduser('~'), '.ai_file_filter')
+
+# Relevance criteria per level, phrased to fit "whether the file name ... '<key>'"
+LEVEL_CRITERIA = {
+    0: "could be considered related to",
+    1: "could be loosely associated with the concept or category of",
+    2: "could be loosely associated with the concept or category of",
+    3: "is somewhat related to the concept or category of",
+    4: "is somewhat related to the concept or category of",
+    5: "can be categorized as",
+    6: "has a clear and direct connection to the concept or category of",
+    7: "is strongly related to the concept or category of",
+    8: "specifically and explicitly represents the concept or category of"
+}
+
+def name_instruction(classification_key, level):
+    # Fixed part of the default yes/no question; the file name follows in a message of its own
+    return f"Decide whether the file name you are given {LEVEL_CRITERIA[level]} '{classification_key}'. Answer with only yes or no."
+
+# Minimum probability of "yes" for a match when the server returns token logprobs; stricter
+# levels need a more confident yes
+LEVEL_CONFIDENCE_THRESHOLDS = {0: 0.2, 1: 0.3, 2: 0.3, 3: 0.4, 4: 0.4, 5: 0.5, 6: 0.6, 7: 0.7, 8: 0.8}
+
+# Words that turn a following "yes"/"no" into an unclear answer ("not yes")
+NEGATIONS = {'not', "don't", 'never', "isn't", "can't", 'cannot'}
+
+
+def parse_yes_no(message):
+    # True or False for a clear yes or no; None for "not yes", "I don't know", or both answers
+    words = re.findall(r"[a-z']+", message.lower())
+    if words and words[0] in ('yes', 'no'):
+        return words[0] == 'yes'
+    found = {word for position, word in enumerate(words)
+             if word in ('yes', 'no') and (position == 0 or words[position - 1] not in NEGATIONS)}
+    if len(found) == 1:
+        return found.pop() == 'yes'
+    return None
+
+
+def json_answer(message):
+    # The "answer" of a {"answer": ...} reply to a constrained question, otherwise the reply as is
+    try:
+        parsed = json.loads(message)
+    except ValueError:
+        return message
+    if isinstance(parsed, dict) and isinstance(parsed.get('answer'), str):
+        return parsed['answer']
+    return message
+
+
+def yes_probability(logprobs):
+    # P(yes) / (P(yes) + P(no)) at the first generated token that offers either, from an
+    # OpenAI-style logprobs block; None when the server sent no usable logprobs
+    try:
+        positions = logprobs['content']
+    except (KeyError, TypeError):
+        return None
+    for position in positions or ():
+        probabilities = {'yes': 0.0, 'no': 0.0}
+        for candidate in position.get('top_logprobs') or [position]:
+            token = str(candidate.get('token', '')).strip().lower()
+            if token in probabilities and candidate.get('logprob') is not None:
+                probabilities[token] += math.exp(candidate['logprob'])
+        total = probabilities['yes'] + probabilities['no']
+        if total > 0:
+            return probabilities['yes'] / total
+    return None
+
+
+def scan_files(folder, extensions=None, recursive=False, excluded_folders=()):
+    # Streams paths relative to folder using os.scandir, so callers can start on the first
+    # match instead of waiting for a full listing. extensions is a set of lowercase
+    # suffixes such as {'.jpg'}; None yields every file.
+    excluded = {os.path.normcase(os.path.abspath(path)) for path in excluded_folders if path}
+    pending_folders = [(folder, '')]
+    while pending_folders:
+        current_folder, relative_folder = pending_folders.pop()
+        try:
+            entries = os.scandir(current_folder)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        if extensions is None or os.path.splitext(entry.name)[1].lower() in extensions:
+                            yield os.path.join(relative_folder, entry.name)
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        if os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                            pending_folders.append((entry.path, os.path.join(relative_folder, entry.name)))
+                except OSError:
+                    continue
+
+def numpy_available():
+    return importlib.util.find_spec('numpy') is not None
+
+def pillow_available():
+    return importlib.util.find_spec('PIL') is not None
+
+# Files the vision mode turns into thumbnails; everything else is still classified by name
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+
+def disk_cached(path, variant, cache_folder, suffix, produce, binary=False):
+    # Returns produce() for a file, cached under cache_folder by the file's path, size and mtime
+    # plus variant (e.g. the thumbnail size), so an unchanged file is only processed once.
+    # produce returns bytes (binary=True) or text, or None, which is not cached. None when the
+    # file is gone. Safe to call from several processes at once.
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = hashlib.sha1(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{variant}".encode('utf-8')).hexdigest()
+    cache_path = os.path.join(cache_folder, key[:2], key + suffix)
+    mode, encoding = ('b', None) if binary else ('', 'utf-8')
+    try:
+        with open(cache_path, 'r' + mode, encoding=encoding) as cached_file:
+            return cached_file.read()
+    except OSError:
+        pass
+
+    result = produce()
+    if result is None:
+        return None
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w' + mode, encoding=encoding) as cached_file:
+            cached_file.write(result)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        pass
+    return result
+
+def load_thumbnail(path, max_size, cache_folder):
+    # Runs in a worker process. Returns JPEG bytes of a copy no larger than max_size pixels,
+    # or None when Pillow is missing or cannot read the file.
+    return disk_cached(path, max_size, cache_folder, '.jpg', lambda: make_thumbnail(path, max_size), binary=True)
+
+def make_thumbnail(path, max_size):
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as image:
+            image.draft('RGB', (max_size, max_size))  # Lets the JPEG decoder skip detail we would throw away
+            image = image.convert('RGB')
+            image.thumbnail((max_size, max_size))
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+    except Exception:
+        return None
+    return buffer.getvalue()
+
+# Documents the content mode reads the start of; everything else is still classified by name
+TEXT_EXTENSIONS = {'.txt', '.md', '.rst', '.log', '.csv', '.tsv', '.json', '.xml', '.html', '.htm', '.ini', '.yaml', '.yml',
+                   '.py', '.js', '.sql', '.tex'}
+SNIPPET_EXTENSIONS = TEXT_EXTENSIONS | {'.pdf', '.docx'}
+# Larger PDFs are classified by name; even parsed lazily, their cross-reference tables can be huge
+MAX_PDF_BYTES = 200 * 1024 * 1024
+
+def pypdf_available():
+    return importlib.util.find_spec('pypdf') is not None
+
+def read_text_start(path, max_bytes):
+    # At most max_bytes are read however large the file is; a cut line or character is dropped
+    with open(path, 'rb') as text_file:
+        data = text_file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        data = data[:max_bytes]
+        if b'\n' in data:
+            data = data[:data.rindex(b'\n')]
+    return data.decode('utf-8', errors='ignore')
+
+def read_docx_start(path, max_bytes):
+    # word/document.xml is inflated only up to a few times the snippet size, then tags are stripped
+    import zipfile
+    with zipfile.ZipFile(path) as archive:
+        with archive.open('word/document.xml') as document:
+            xml = document.read(max_bytes * 8).decode('utf-8', errors='ignore')
+    text = re.sub(r'</w:p>|<w:br/>', '\n', xml)
+    return re.sub(r'<[^>]*>?', '', text)[:max_bytes]
+
+def read_pdf_start(path, max_bytes, max_pages=3):
+    # Given a path, pypdf reads the whole file into memory; given an open file it seeks to the
+    # objects it needs, so only the first pages of a large PDF are read and parsed
+    if os.path.getsize(path) > MAX_PDF_BYTES:
+        return None
+    from pypdf import PdfReader
+    text = ''
+    with open(path, 'rb') as pdf_file:
+        for page in PdfReader(pdf_file).pages[:max_pages]:
+            text += (page.extract_text() or '') + '\n'
+            if len(text) >= max_bytes:
+                break
+    return text[:max_bytes]
+
+def load_snippet(path, max_bytes, cache_folder):
+    # Runs in a worker process. Returns the first max_bytes of a document's text with
+    # whitespace collapsed ('' when it has none), or None when the file cannot be read.
+    return disk_cached(path, max_bytes, cache_folder, '.txt', lambda: read_snippet(path, max_bytes))
+
+def read_snippet(path, max_bytes):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension == '.docx':
+            text = read_docx_start(path, max_bytes)
+        elif extension == '.pdf':
+            if not pypdf_available():
+                return None
+            text = read_pdf_start(path, max_bytes)
+            if text is None:
+                return None
+        elif extension in ('.csv', '.tsv'):
+            # The header and the first rows say what a table holds
+            text = "\n".join(read_text_start(path, max_bytes).splitlines()[:10])
+        else:
+            text = read_text_start(path, max_bytes)
+    except Exception:
+        return None
+
+    return re.sub(r'[ \t\r\f\v]+', ' ', re.sub(r'\n\s*\n+', '\n', text)).strip()
+
+# Cosine similarity bounds (reject_below, accept_above) used by the embedding pre-filter.
+# Stricter levels reject more names outright and need a closer match to skip the LLM.
+LEVEL_EMBEDDING_THRESHOLDS = {
+    0: (0.20, 0.60),
+    1: (0.25, 0.65),
+    2: (0.25, 0.70),
+    3: (0.30, 0.72),
+    4: (0.30, 0.75),
+    5: (0.35, 0.78),
+    6: (0.40, 0.82),
+    7: (0.45, 0.85),
+    8: (0.50, 0.90)
+}
+
+# EmbeddingPrefilter Class
+class EmbeddingPrefilter:
+    # Settles obvious matches and non-matches by embedding similarity so only the
+    # ambiguous middle band is sent to the chat model. Names are embedded batch_size at a
+    # time: a request for a few names is filled up with names the scanner has announced
+    # through expect(), so their scores are ready before they are asked about. Every announced
+    # file is settled with forget() once it has been asked about or will not be, so names that
+    # are never asked are not embedded, or their scores not kept, for the rest of the run.
+    def __init__(self, client, model, targets, level, thresholds=None, batch_size=64):
+        self.client = client
+        self.model = model
+        # One target for yes/no runs, or the category names for routed runs
+        self.targets = list(targets)
+        self.reject_below, self.accept_above = (thresholds or LEVEL_EMBEDDING_THRESHOLDS)[level]
+        self.target_vectors = None
+        self.batch_size = max(1, int(batch_size))
+        self.upcoming = deque()  # Names scanned but not embedded yet
+        self.wanted = {}  # name -> announced files with that name not settled yet
+        self.scores = {}  # name -> (best target index, best similarity), embedded ahead of its request
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.ambiguous = 0
+
+    def embed(self, texts):
+        import numpy
+
+        vectors = numpy.asarray(self.client.embed(self.model, texts), dtype=numpy.float32)
+        # Normalize once so cosine similarity becomes a plain matrix product
+        norms = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / numpy.maximum(norms, 1e-12)
+
+    def expect(self, name):
+        with self.lock:
+            self.wanted[name] = self.wanted.get(name, 0) + 1
+            self.upcoming.append(name)
+
+    def forget(self, name):
+        with self.lock:
+            count = self.wanted.get(name)
+            if count is None:
+                return  # Not announced, e.g. an image whose thumbnail failed
+            if count > 1:
+                self.wanted[name] = count - 1
+            else:
+                del self.wanted[name]
+                self.scores.pop(name, None)
+
+    def reset(self):
+        with self.lock:
+            self.upcoming.clear()
+            self.wanted.clear()
+            self.scores.clear()
+
+    def decide(self, names):
+        # Returns {name: True/False/category} for settled names; ambiguous names are left out.
+        # Embedding runs under the lock, so a worker waiting here usually finds its names
+        # already scored by the batch in progress.
+        names = list(dict.fromkeys(names))
+        with self.lock:
+            if self.target_vectors is None:
+                self.target_vectors = self.embed(self.targets)
+            chunk = dict.fromkeys(name for name in names if name not in self.scores)
+            if chunk:
+                while self.upcoming and len(chunk) < self.batch_size:
+                    name = self.upcoming.popleft()
+                    if name in self.wanted and name not in self.scores:
+                        chunk[name] = None
+                chunk = list(chunk)
+                similarities = self.embed(chunk) @ self.target_vectors.T
+                for name, best_target, best_score in zip(chunk, similarities.argmax(axis=1), similarities.max(axis=1)):
+                    self.scores[name] = (int(best_target), float(best_score))
+            scores = [self.scores.pop(name) for name in names]
+
+        decisions = {}
+        for name, (best_target, best_score) in zip(names, scores):
+            if best_score < self.reject_below:
+                decisions[name] = False
+                self.rejected += 1
+            elif best_score >= self.accept_above:
+                decisions[name] = True if len(self.targets) == 1 else self.targets[best_target]
+                self.accepted += 1
+            else:
+                self.ambiguous += 1
+        return decisions
+
+# ClassificationCache Class
+class ClassificationCache:
+    # Persistent store of answers keyed by (normalized name, key, level, prompt, model). The
+    # decision is stored JSON encoded (true/false, or the category name of a routed run), so a
+    # category such as "2023" comes back as the string it was.
+    def __init__(self, path=None, max_entries=200000, max_age_days=30, touch_batch=500):
+        self.path = path or os.path.join(APP_DATA_DIR, 'classification_cache.sqlite3')
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # last_used only orders eviction, so hits queue their refresh here and it is written in
+        # one transaction every touch_batch hits (or with the next write) instead of per hit
+        self.touched = {}  # primary key -> time of the last hit
+        self.touch_batch = touch_batch
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Shared between the worker threads of a run, access is serialized by self.lock
+        import sqlite3
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL with synchronous=NORMAL does not fsync on every commit; a crash can only lose the
+        # last few answers, which are asked again
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Version 0 kept decisions in an INTEGER column, where numeric category names turned
+            # into numbers; those entries cannot be told apart from yes/no, so they are dropped
+            self.connection.execute("DROP TABLE IF EXISTS results")
+            self.connection.execute("PRAGMA user_version = 1")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " name TEXT NOT NULL, classification_key TEXT NOT NULL, level INTEGER NOT NULL,"
+            " prompt TEXT NOT NULL, model TEXT NOT NULL, decision TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (name, classification_key, level, prompt, model))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.connection.commit()
+        self.evict()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, name, classification_key, level, prompt, model):
+        # Like get() is not None, without counting a hit or miss or refreshing the entry
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT created FROM results WHERE name = ? AND classification_key = ?"
+                " AND level = ? AND prompt = ? AND model = ?",
+                (name, classification_key, level, prompt or '', model)
+            ).fetchone()
+        return row is not None and time.time() - row[0] <= self.max_age_seconds
+
+    def get(self, name, classification_key, level, prompt, model):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT decision, created FROM results WHERE name = ? AND classification_key = ?"
+                " AND level = ? AND prompt = ? AND model = ?",
+                (name, classification_key, level, prompt or '', model)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched[(name, classification_key, level, prompt or '', model)] = time.time()
+            if len(self.touched) >= self.touch_batch:
+                self.write_touched()
+                self.connection.commit()
+            return json.loads(row[0])
+
+    def put(self, name, classification_key, level, prompt, model, is_match):
+        now = time.time()
+        with self.lock:
+            self.write_touched()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, classification_key, level, prompt or '', model, json.dumps(is_match), now, now)
+            )
+            self.connection.commit()
+
+    def write_touched(self):
+        # Call with lock held; the caller commits
+        if self.touched:
+            self.connection.executemany(
+                "UPDATE results SET last_used = ? WHERE name = ? AND classification_key = ?"
+                " AND level = ? AND prompt = ? AND model = ?",
+                [(last_used,) + key for key, last_used in self.touched.items()]
+            )
+            self.touched.clear()
+
+    def evict(self):
+        # Drop expired answers first, then the least recently used ones above max_entries
+        with self.lock:
+            self.write_touched()
+            self.connection.execute("DELETE FROM results WHERE created < ?", (time.time() - self.max_age_seconds,))
+            self.connection.execute(
+                "DELETE FROM results WHERE rowid IN ("
+                " SELECT rowid FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.write_touched()
+            self.connection.commit()
+            self.connection.close()
+
+def file_hasher():
+    # xxhash is much faster when installed; BLAKE2 from the standard library otherwise
+    try:
+        import xxhash
+        return xxhash.xxh3_128()
+    except ImportError:
+        return hashlib.blake2b(digest_size=16)
+
+def kernel_copy_functions():
+    # function(source fd, destination fd, offset, count) -> bytes copied, tried in order
+    functions = []
+    if hasattr(os, 'copy_file_range'):
+        # Can reflink on btrfs/XFS or copy server-side on NFS
+        functions.append(lambda source_fd, destination_fd, offset, count:
+                         os.copy_file_range(source_fd, destination_fd, count, offset))
+    if sys.platform.startswith('linux'):
+        functions.append(lambda source_fd, destination_fd, offset, count:
+                         os.sendfile(destination_fd, source_fd, offset, count))
+    return functions
+
+
+def copy_file(source_path, destination_path):
+    # Like shutil.copy, but the data is copied inside the kernel when the platform allows it,
+    # with a buffered copy as the fallback. The destination is opened exclusively so an
+    # existing file is never overwritten.
+    with open(source_path, 'rb') as source_file, open(destination_path, 'xb') as destination_file:
+        source_fd, destination_fd = source_file.fileno(), destination_file.fileno()
+        size = os.fstat(source_fd).st_size
+        copied = 0
+        for copy_function in kernel_copy_functions():
+            try:
+                while copied < size:
+                    sent = copy_function(source_fd, destination_fd, copied, size - copied)
+                    if not sent:
+                        break
+                    copied += sent
+            except OSError as e:
+                # Not supported for this pair of file systems; try the next way while nothing is written
+                if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                    raise
+            if copied:
+                break
+        if copied < size:
+            # Kernel copy unavailable, or the file grew while it was copied
+            source_file.seek(copied)
+            destination_file.seek(copied)
+            shutil.copyfileobj(source_file, destination_file)
+    shutil.copymode(source_path, destination_path)
+
+
+def rename_exclusive(source_path, destination_path):
+    # Like os.rename, but fails instead of replacing a file that appeared at destination_path
+    # after its name was picked. A hard link cannot overwrite anything; file systems without
+    # hard links (FAT, some network shares) get a check right before the rename.
+    try:
+        os.link(source_path, destination_path)
+    except OSError as e:
+        if e.errno in (errno.EEXIST, errno.EXDEV):
+            raise
+        if os.path.lexists(destination_path):
+            raise FileExistsError(errno.EEXIST, "File exists", destination_path)
+        os.rename(source_path, destination_path)
+        return
+    os.unlink(source_path)
+
+
+def move_file(source_path, destination_path, same_device):
+    # A rename is a metadata-only operation; across devices the data is copied, then the source removed
+    if same_device:
+        try:
+            rename_exclusive(source_path, destination_path)
+            return
+        except OSError as e:
+            # Bind mounts can share st_dev and still refuse to rename between each other
+            if e.errno != errno.EXDEV:
+                raise
+    copy_file(source_path, destination_path)
+    shutil.copystat(source_path, destination_path)
+    os.remove(source_path)
+
+# ContentIndex Class
+class ContentIndex:
+    # Finds byte-identical files. Sizes are compared first, so a file with a unique size is
+    # never read; same-size files compare a hash of their first block and are only hashed
+    # in full when that matches too. Every file is filed under the shallowest of these keys
+    # that tells it apart, so a lookup is a few dict probes however many files share a size.
+    def __init__(self, prefix_size=64 * 1024, chunk_size=1024 * 1024):
+        self.prefix_size = prefix_size
+        self.chunk_size = chunk_size
+        # (level, size[, digest]) -> path with that content, or None when several contents share
+        # the key and the next level tells them apart
+        self.entries = {}
+        self.keys = {}  # indexed path -> its key in entries
+        self.digests = {}  # (path, prefix only) -> digest
+        self.lock = threading.Lock()
+
+    def digest(self, path, prefix_only):
+        key = (path, prefix_only)
+        if key not in self.digests:
+            hasher = file_hasher()
+            remaining = self.prefix_size if prefix_only else None
+            with open(path, 'rb') as source_file:
+                while remaining is None or remaining > 0:
+                    chunk = source_file.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+            self.digests[key] = hasher.digest()
+        return self.digests[key]
+
+    def key(self, path, size, level):
+        # Level 0 is the size, 1 adds the hash of the first block, 2 the hash of the whole file
+        if level == 0:
+            return (0, size)
+        return (level, size, self.digest(path, level == 1))
+
+    def last_level(self, size):
+        # The first block already covers small files completely
+        return 1 if size <= self.prefix_size else 2
+
+    def add(self, path):
+        # Only one file per content is kept, which is all find_or_add needs
+        self.find_or_add(path)
+
+    def discard(self, path):
+        with self.lock:
+            key = self.keys.pop(path, None)
+            if key is not None and self.entries.get(key) == path:
+                del self.entries[key]
+
+    def rename(self, old_path, new_path):
+        # Keeps the entry (and its cached digests) when the indexed file is copied or moved elsewhere
+        with self.lock:
+            key = self.keys.pop(old_path, None)
+            if key is not None:
+                self.keys[new_path] = key
+                if self.entries.get(key) == old_path:
+                    self.entries[key] = new_path
+            for prefix_only in (True, False):
+                if (old_path, prefix_only) in self.digests:
+                    self.digests[(new_path, prefix_only)] = self.digests.pop((old_path, prefix_only))
+
+    def find_or_add(self, path):
+        # Returns an indexed file with the same content, or indexes path and returns it as the
+        # leader of a new group. Files are hashed outside the lock and every change to entries
+        # is made under it, so two identical files handled at the same time never both count as new.
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return path
+        level = 0
+        while True:
+            try:
+                key = self.key(path, size, level)
+            except OSError:
+                return path
+            with self.lock:
+                leader = self.entries.get(key, path)
+                if leader == path:
+                    self.entries[key] = path
+                    self.keys[path] = key
+                    return path
+            if leader is not None:
+                if level == self.last_level(size):
+                    return leader
+                # The leader was the only file with this key so far; file it one level deeper
+                try:
+                    leader_key = self.key(leader, size, level + 1)
+                except OSError:
+                    self.discard(leader)  # Moved or deleted meanwhile
+                    continue
+                with self.lock:
+                    if self.entries.get(key) != leader:
+                        continue  # Changed meanwhile; look at this level again
+                    self.entries[key] = None
+                    self.entries[leader_key] = leader
+                    self.keys[leader] = leader_key
+            level += 1
+
+# Camera and phone prefixes that carry no meaning ("IMG_0042", "PXL_20240101_...")
+CAMERA_PREFIXES = re.compile(r'^(img|dsc|dscn|dscf|dcim|pxl|vid|mvimg|gopr|dji|mov|wp|screenshot|screen shot)(?=[\W_\d]|$)')
+DATE_PATTERN = re.compile(r'(19|20)\d{2}[-_.]?(0[1-9]|1[0-2])[-_.]?(0[1-9]|[12]\d|3[01])([-_. t]?\d{2}[-_.]?\d{2}([-_.]?\d{2})?)?')
+
+
+def name_stem(name):
+    # Canonical form shared by near-identical names: "trip_paris_001" and "Trip-Paris 2023-07-14"
+    # both become "trip paris"; names made only of a camera prefix and numbers become ""
+    stem = CAMERA_PREFIXES.sub('', name.lower())
+    stem = DATE_PATTERN.sub(' ', stem)
+    stem = re.sub(r'\d+', ' ', stem)
+    return re.sub(r'[\W_]+', ' ', stem).strip()
+
+
+# NameGroups Class
+class NameGroups:
+    # Buckets files by name stem so one representative per bucket is classified and its decision
+    # is reused by the other members. Every spot_check_interval-th member is still classified; a
+    # spot check that disagrees, or a representative whose confidence falls inside
+    # confidence_band, splits the bucket and the members after it are classified one by one;
+    # members that were waiting for such a representative are handed back through requeue().
+    def __init__(self, spot_check_interval=20, confidence_band=(0.2, 0.8)):
+        self.spot_check_interval = spot_check_interval
+        self.confidence_band = confidence_band
+        self.groups = {}  # stem -> {'seen', 'decided', 'decision', 'split'}
+        self.members = {}  # path -> stem, for files that reuse the group decision
+        self.checks = {}  # path -> stem, for representatives and spot checks
+        self.reused = 0
+        self.split = 0
+
+    def assign(self, path, stem):
+        # True when path has to be classified, False when it reuses the decision of its group.
+        # Names with nothing left but numbers and camera prefixes (IMG_2041, 20240101_123456)
+        # say nothing about each other and are never grouped.
+        if not stem:
+            return True
+        group = self.groups.get(stem)
+        if group is None:
+            self.groups[stem] = {'seen': 1, 'decided': False, 'decision': None, 'split': False}
+            self.checks[path] = stem
+            return True
+        group['seen'] += 1
+        if group['split']:
+            return True
+        if self.spot_check_interval and group['seen'] % self.spot_check_interval == 0:
+            self.checks[path] = stem
+            return True
+        self.members[path] = stem
+        return False
+
+    def requeue(self, path):
+        # True for a member whose group was split after it was assigned (the representative came
+        # back unclear or unsure, or a spot check disagreed); it has to be classified on its own
+        stem = self.members.get(path)
+        if stem is None or not self.groups[stem]['split']:
+            return False
+        del self.members[path]
+        return True
+
+    def resolve(self, path, decision, confidence=None):
+        # Called in scan order, so a representative is always resolved before its members
+        stem = self.members.pop(path, None)
+        if stem is not None:
+            self.reused += 1
+            return self.groups[stem]['decision']
+        stem = self.checks.pop(path, None)
+        if stem is None:
+            return decision
+        group = self.groups[stem]
+        if not group['decided']:
+            group['decided'], group['decision'] = True, decision
+            unsure = confidence is not None and self.confidence_band[0] < confidence < self.confidence_band[1]
+            if decision is None or unsure:
+                self.split_group(group)
+        elif decision is not None and decision != group['decision']:
+            self.split_group(group)
+        return decision
+
+    def split_group(self, group):
+        if not group['split']:
+            group['split'] = True
+            self.split += 1
+
+def stratified_sample(file_names, sample_size, rng, cluster_of):
+    # Returns [(file_name, weight)]. Each extension gets a share of the sample in proportion to
+    # its file count. Inside an extension, files are ordered by name cluster (cluster_of) and
+    # every n-th one is taken, so clusters are covered in proportion to their size and small
+    # ones are not skipped by chance. Weights add up to the number of files, so a weighted
+    # mean over the sample estimates the whole folder.
+    if len(file_names) <= sample_size:
+        return [(file_name, 1.0) for file_name in file_names]
+    strata = {}
+    for file_name in file_names:
+        extension = os.path.splitext(file_name)[1].lower()
+        strata.setdefault(extension, {}).setdefault(cluster_of(file_name), []).append(file_name)
+
+    sample = []
+    for clusters in strata.values():
+        clusters = list(clusters.values())
+        rng.shuffle(clusters)
+        for cluster in clusters:
+            rng.shuffle(cluster)
+        ordered = [file_name for cluster in clusters for file_name in cluster]
+        quota = min(len(ordered), max(1, round(sample_size * len(ordered) / len(file_names))))
+        step = len(ordered) / quota
+        offset = rng.random() * step
+        sample.extend((ordered[int(offset + position * step)], len(ordered) / quota) for position in range(quota))
+    return sample
+
+def read_json_lines(path):
+    # Entries of a JSON-lines file; nothing when it does not exist
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as lines_file:
+        for line in lines_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # A crash can leave a partially written last line
+
+# JsonLinesFile Class
+class JsonLinesFile:
+    # Append-only JSON-lines writer, fsynced every sync_every entries or sync_interval seconds.
+    # The file is opened on the first append and again after close(), so a log that never gets
+    # an entry is never created. Not thread-safe; callers serialize access.
+    def __init__(self, path, sync_every=100, sync_interval=2.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.unsynced = 0
+        self.last_sync = time.time()
+        self.file = None
+
+    def append(self, entry):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps(entry) + '\n')
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or time.time() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.time()
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+# RunJournal Class
+class RunJournal:
+    # Append-only JSON-lines log of per-file decisions for one set of run parameters, so an
+    # interrupted run can skip what it already finished. Writes are fsynced in batches.
+    def __init__(self, run_parameters, folder=None, sync_every=100, sync_interval=2.0):
+        run_id = hashlib.sha1(json.dumps(run_parameters, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.folder = folder or os.path.join(APP_DATA_DIR, 'journals')
+        self.path = os.path.join(self.folder, f'{run_id}.jsonl')
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.completed = self.load()
+        self.log = JsonLinesFile(self.path, sync_every, sync_interval)
+        if not self.completed:
+            self.log.append({'run': run_parameters, 'started': time.time()})
+
+    def load(self):
+        # Files with a definite decision; failed requests are not listed so they get retried
+        return {entry['file'] for entry in read_json_lines(self.path)
+                if 'file' in entry and entry.get('decision') is not None}
+
+    def record(self, file_name, decision, action=None, destination_path=None, confidence=None):
+        with self.lock:
+            self.log.append({'file': file_name, 'decision': decision, 'action': action,
+                             'destination': destination_path, 'confidence': confidence, 'time': time.time()})
+
+    def close(self, finished=False):
+        # A finished journal is kept for reference but no longer resumed from
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if finished:
+                self.log.append({'finished': time.time()})
+            self.log.close()
+            if finished:
+                os.replace(self.path, self.path[:-len('.jsonl')] + time.strftime('.done-%Y%m%d-%H%M%S.jsonl'))
+
+# OperationLog Class
+class OperationLog:
+    # Persistent JSON-lines record of every copy and move with its real source and destination
+    # paths, so a whole run or any part of it can be reverted later, also after a restart.
+    # Reverting appends a 'reverted' entry instead of rewriting the file.
+    def __init__(self, path=None, folder=None, sync_every=100, sync_interval=2.0):
+        folder = folder or os.path.join(APP_DATA_DIR, 'operations')
+        self.path = path or os.path.join(folder, time.strftime('%Y%m%d-%H%M%S-') + os.urandom(3).hex() + '.jsonl')
+        self.lock = threading.Lock()
+        # Runs that transfer nothing leave no file, see JsonLinesFile
+        self.log = JsonLinesFile(self.path, sync_every, sync_interval)
+        self.operations = self.load()  # destination path -> entry, for operations not reverted yet
+
+    def load(self):
+        operations = {}
+        for entry in read_json_lines(self.path):
+            if 'reverted' in entry:
+                operations.pop(entry['reverted'], None)
+            elif 'destination' in entry:
+                operations[entry['destination']] = entry
+        return operations
+
+    def record(self, action, source_path, destination_path):
+        entry = {'action': action, 'source': os.path.abspath(source_path),
+                 'destination': os.path.abspath(destination_path), 'time': time.time()}
+        with self.lock:
+            self.log.append(entry)
+            self.operations[entry['destination']] = entry
+
+    def pending(self):
+        with self.lock:
+            return list(self.operations.values())
+
+    def revert(self, destination_paths=None, workers=8, callback=None):
+        # Undoes the operations whose destination is listed (all of them by default) and returns
+        # the number reverted and a list of (destination, error) pairs. Operations are batched by
+        # the device they sit on, and every batch gets its own pool, so a slow USB drive does not
+        # hold up the rest. Removing a copy or renaming a move back is cheap and runs workers
+        # wide; moving back across devices copies data and runs two at a time per device.
+        # callback(entry, error) is called from the pools after each operation.
+        with self.lock:
+            if destination_paths is None:
+                entries = list(self.operations.values())
+            else:
+                entries = [self.operations[os.path.abspath(path)] for path in destination_paths
+                           if os.path.abspath(path) in self.operations]
+        batches = {}
+        for entry in entries:
+            destination_device = folder_device_id(os.path.dirname(entry['destination']))
+            same_device = entry['action'] == 'copied' or destination_device == folder_device_id(os.path.dirname(entry['source']))
+            batches.setdefault((destination_device, same_device), []).append(entry)
+
+        reverted = 0
+        errors = []
+        results_lock = threading.Lock()
+
+        def revert_one(entry, same_device):
+            nonlocal reverted
+            try:
+                self.revert_entry(entry, same_device)
+                error = None
+            except Exception as e:
+                error = str(e)
+            with results_lock:
+                if error is None:
+                    reverted += 1
+                else:
+                    errors.append((entry['destination'], error))
+            if error is None:
+                with self.lock:
+                    self.log.append({'reverted': entry['destination'], 'time': time.time()})
+                    self.operations.pop(entry['destination'], None)
+            if callback is not None:
+                callback(entry, error)
+
+        pools = [ThreadPoolExecutor(max_workers=workers if same_device else 2) for _, same_device in batches]
+        try:
+            for pool, ((_, same_device), batch) in zip(pools, batches.items()):
+                for entry in batch:
+                    pool.submit(revert_one, entry, same_device)
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True)
+            with self.lock:
+                self.log.sync()
+        return reverted, errors
+
+    def revert_entry(self, entry, same_device):
+        source_path, destination_path = entry['source'], entry['destination']
+        if entry['action'] == 'copied':
+            # Never delete what may have become the only copy
+            if not os.path.exists(source_path):
+                raise FileNotFoundError(errno.ENOENT, "The original file is gone; the copy is kept", source_path)
+            os.remove(destination_path)
+            return
+        if os.path.lexists(source_path):
+            raise FileExistsError(errno.EEXIST, "A file already exists at the original location", source_path)
+        os.makedirs(os.path.dirname(source_path), exist_ok=True)
+        move_file(destination_path, source_path, same_device)
+
+    def close(self):
+        with self.lock:
+            self.log.close()
+
+
+def operation_logs(folder=None):
+    # Logged runs, newest first
+    folder = folder or os.path.join(APP_DATA_DIR, 'operations')
+    try:
+        names = [name for name in os.listdir(folder) if name.endswith('.jsonl')]
+    except OSError:
+        return []
+    return [os.path.join(folder, name) for name in sorted(names, reverse=True)]
+
+
+def folder_device_id(folder):
+    # None when the folder is gone; such operations fail on their own when reverted
+    try:
+        return os.stat(folder).st_dev
+    except OSError:
+        return None
+
+
+def watchdog_available():
+    return importlib.util.find_spec('watchdog') is not None
+
+# FolderWatcher Class
+class FolderWatcher:
+    # Reports files that appear in a folder (new or renamed into it) once their size and mtime
+    # have stopped changing for settle_seconds, so half-written files are never picked up.
+    # watchdog (inotify, FSEvents, ReadDirectoryChangesW) reports arrivals when installed;
+    # otherwise the folder is rescanned every poll_interval and compared with the known files.
+    def __init__(self, folder, extensions=None, recursive=False, excluded_folders=(), settle_seconds=2.0, poll_interval=2.0):
+        self.folder = os.path.abspath(folder)
+        self.extensions = extensions
+        self.recursive = recursive
+        self.excluded_folders = excluded_folders
+        self.excluded = {os.path.normcase(os.path.abspath(path)) for path in excluded_folders if path}
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.known = set(scan_files(folder, extensions, recursive, excluded_folders))
+        self.pending = {}  # relative path -> ((size, mtime), monotonic time it was last seen changing)
+        self.arrivals = queue.Queue()  # relative paths reported by watchdog
+        self.observer = None
+        if watchdog_available():
+            self.start_observer()
+
+    def start_observer(self):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        watcher = self
+
+        # ArrivalHandler Class
+        class ArrivalHandler(FileSystemEventHandler):
+            def on_created(self, event):
+                watcher.report(event.src_path, event.is_directory)
+
+            def on_modified(self, event):
+                watcher.report(event.src_path, event.is_directory)
+
+            def on_moved(self, event):
+                watcher.forget(event.src_path)
+                watcher.report(event.dest_path, event.is_directory)
+
+            def on_deleted(self, event):
+                watcher.forget(event.src_path)
+
+        self.observer = Observer()
+        self.observer.schedule(ArrivalHandler(), self.folder, recursive=self.recursive)
+        self.observer.daemon = True
+        self.observer.start()
+
+    def relative_path(self, path):
+        # Relative path of a file the watcher cares about, or None
+        relative = os.path.relpath(os.path.abspath(os.fsdecode(path)), self.folder)
+        if relative.startswith(os.pardir) or (not self.recursive and os.sep in relative):
+            return None
+        if self.extensions and os.path.splitext(relative)[1].lower() not in self.extensions:
+            return None
+        parent = os.path.dirname(os.path.join(self.folder, relative))
+        while parent != self.folder:
+            if os.path.normcase(parent) in self.excluded:
+                return None
+            parent = os.path.dirname(parent)
+        return relative
+
+    def report(self, path, is_directory):
+        path = os.fsdecode(path)
+        if is_directory:
+            # A folder moved in arrives as one event; its files are listed here
+            if self.recursive:
+                for file_name in scan_files(path, None, True, self.excluded_folders):
+                    self.report(os.path.join(path, file_name), False)
+            return
+        relative = self.relative_path(path)
+        if relative is not None:
+            self.arrivals.put(relative)
+
+    def forget(self, path):
+        relative = self.relative_path(path)
+        if relative is not None:
+            self.arrivals.put((None, relative))
+
+    def mark_known(self, file_names):
+        self.known.update(file_names)
+
+    def collect_arrivals(self):
+        if self.observer is None:
+            current = set(scan_files(self.folder, self.extensions, self.recursive, self.excluded_folders))
+            self.known &= current  # Deleted files can come back later under the same name
+            return current - self.known
+        arrivals = set()
+        while True:
+            try:
+                item = self.arrivals.get_nowait()
+            except queue.Empty:
+                return arrivals - self.known
+            if isinstance(item, tuple):
+                arrivals.discard(item[1])
+                self.known.discard(item[1])
+                self.pending.pop(item[1], None)
+            else:
+                arrivals.add(item)
+
+    def poll(self):
+        # Returns the arrivals whose size and mtime have been stable for settle_seconds
+        now = time.monotonic()
+        for file_name in self.collect_arrivals():
+            self.pending.setdefault(file_name, (None, now))
+        ready = []
+        for file_name, (signature, changed_at) in list(self.pending.items()):
+            try:
+                stat = os.stat(os.path.join(self.folder, file_name))
+            except OSError:
+                del self.pending[file_name]  # Gone again, e.g. a temporary download file
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self.pending[file_name] = (current, now)
+            elif now - changed_at >= self.settle_seconds:
+                del self.pending[file_name]
+                self.known.add(file_name)
+                ready.append(file_name)
+        return sorted(ready)
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join(timeout=5)
+
+# AdaptiveLimit Class
+class AdaptiveLimit:
+    # AIMD concurrency limit for the request stage. Every reply close to the fastest recent
+    # reply adds 1/limit (one more request in flight per round of successes); a reply slower
+    # than tolerance times that baseline shrinks the limit by decrease, and a failed request
+    # halves it. The baseline drifts up slowly so it follows a model that got slower overall.
+    def __init__(self, maximum, minimum=1, initial=1, tolerance=1.5, decrease=0.9):
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.baseline = None
+        self.lock = threading.Lock()
+
+    def record(self, latency, failed=False):
+        with self.lock:
+            if failed:
+                self.limit = max(self.minimum, self.limit * 0.5)
+                return
+            self.baseline = latency if self.baseline is None else min(self.baseline * 1.002, latency)
+            if latency > self.tolerance * self.baseline:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+
+# Orders a run can process files in; anything but 'scan' lists the whole folder before the first request
+FILE_ORDERS = ('scan', 'newest', 'oldest', 'largest', 'smallest')
+
+
+# FileClassifier Class
+class FileClassifier:
+    # Qt-free classification pipeline; the GUI thread and the command line plug in callbacks
+    def __init__(self, source_folder, destination_folder, classification_key, level, move_files, selected_model, selected_extensions, custom_prompt=None, max_in_flight=1, cache=None, batch_size=1, category_destinations=None, recursive=False, prefilter_model=None,
+                 resumable=False, client=None, answer_retries=0, dedupe_content=False, skip_existing_duplicates=False,
+                 vision_model=None, thumbnail_size=512, transfer_workers=4, constrained_decisions=False,
+                 group_similar_names=False, spot_check_interval=20, adaptive_concurrency=False, read_documents=False,
+                 snippet_bytes=4096, order='scan', priority_files=None, prefilter_batch_size=64, operation_log=True,
+                 progress_callback=None, status_callback=None, file_callback=None, metrics_callback=None):
+        # Callbacks receive (percent), (message), (file name, action, destination path) and
+        # (RunMetrics snapshot dict)
+        self.progress_callback = progress_callback or (lambda percent: None)
+        self.status_callback = status_callback or (lambda message: None)
+        self.file_callback = file_callback or (lambda file_name, action, destination_path: None)
+        self.metrics_callback = metrics_callback or (lambda snapshot: None)
+        self.source_folder = source_folder
+        self.destination_folder = destination_folder
+        self.classification_key = classification_key
+        self.level = level
+        self.move_files = move_files
+        self.selected_model = selected_model
+        self.selected_extensions = {ext.lower() for ext in selected_extensions}
+        self.custom_prompt = custom_prompt
+        # Descend into subfolders of source_folder; matches are still written flat into the destination
+        self.recursive = recursive
+        # Scanner progress, updated by the scanning thread while classification runs
+        self.scanned_count = 0
+        self.scan_complete = False
+        # Maximum number of classification requests sent to Ollama at the same time
+        self.max_in_flight = max(1, int(max_in_flight))
+        # With adaptive_concurrency, max_in_flight is only the upper bound and the number of
+        # requests in flight follows the observed latency
+        self.concurrency = AdaptiveLimit(self.max_in_flight) if adaptive_concurrency else None
+        # Guards destination name resolution so two writes never pick the same path
+        self.transfer_lock = threading.Lock()
+        self.index_lock = threading.Lock()  # Guards building the destination content indexes
+        # Copies and moves run in their own small pool so a large file never holds up the next request
+        self.transfer_workers = max(1, int(transfer_workers))
+        self.transfer_pool = None
+        self.transfer_slots = None  # Bounds queued transfers; the result loop waits when I/O falls behind
+        # Transfers finish in any order; their callbacks are held back until the earlier files
+        # have reported, so copy signals keep the order of the files
+        self.report_lock = threading.Lock()
+        self.pending_reports = {}  # transfer number -> (callback, args)
+        self.transfer_count = 0
+        self.reported_count = 0
+        self.destination_names = {}  # destination folder -> lowercased names taken, listed once per run
+        self.folder_devices = {}  # folder -> st_dev, to tell renames from cross-device copies
+        # Optional ClassificationCache consulted before asking the model
+        self.cache = cache
+        # Number of file names packed into one chat completion (1 = one request per file)
+        self.batch_size = max(1, int(batch_size))
+        # Optional {category: destination folder}; when set, each file is routed to the
+        # category the model picks instead of a yes/no answer against classification_key
+        self.category_destinations = dict(category_destinations or {})
+        if self.category_destinations:
+            self.classification_key = "categories: " + " | ".join(sorted(self.category_destinations))
+        # Shared OllamaClient; its connection pool is sized to the number of requests in flight
+        self.client = client or OllamaClient(pool_size=self.max_in_flight)
+        # How often to re-ask the model when its reply is neither a yes nor a no
+        self.answer_retries = max(0, int(answer_retries))
+        # Optional embedding pre-filter; a custom prompt has no key to compare names against
+        self.prefilter = None
+        if prefilter_model and not custom_prompt:
+            self.prefilter = EmbeddingPrefilter(self.client, prefilter_model, self.category_destinations or [classification_key], level,
+                                                batch_size=prefilter_batch_size)
+        # Classify byte-identical source files once and reuse the decision for the whole group
+        self.source_index = ContentIndex() if dedupe_content else None
+        self.content_leaders = {}  # duplicate path -> path of the first file with that content
+        self.content_decisions = {}  # group leader path -> decision
+        self.duplicate_count = 0
+        # Classify one file per group of near-identical names and reuse the decision for the rest
+        self.name_groups = NameGroups(spot_check_interval) if group_similar_names else None
+        self.requeued_files = deque()  # (number, file name) of group members to classify after all
+        # Skip transfers whose content already exists in the destination folder
+        self.skip_existing_duplicates = skip_existing_duplicates
+        self.destination_indexes = {}  # destination folder -> ContentIndex, built on first use
+        # Optional multimodal model that judges images by a downscaled thumbnail instead of their name
+        self.vision_model = vision_model
+        self.thumbnail_size = thumbnail_size
+        self.thumbnail_folder = os.path.join(APP_DATA_DIR, 'thumbnails')
+        self.thumbnail_pool = None  # ProcessPoolExecutor decoding images while requests are in flight
+        self.thumbnail_futures = {}  # image path -> future of its thumbnail bytes
+        # Optionally add the start of text documents (plain text, CSV, PDF, DOCX) to their prompt
+        self.read_documents = read_documents
+        self.snippet_bytes = snippet_bytes
+        self.snippet_folder = os.path.join(APP_DATA_DIR, 'snippets')
+        self.snippet_pool = None  # ProcessPoolExecutor extracting snippets while requests are in flight
+        self.snippet_futures = {}  # document path -> future of its snippet text
+        # Short, constrained replies: yes/no questions are capped at two tokens and decided from
+        # the token logprobs when the server returns them, batches follow a JSON schema
+        self.constrained_decisions = constrained_decisions
+        self.confidences = {}  # normalized name -> P(yes) of its last logprob-based decision
+        # Request kind -> system message shared by every request of that kind, see build_instructions()
+        self.instructions = None
+        # Files named in priority_files (paths relative to the source folder) are processed first,
+        # the rest in the given order (see FILE_ORDERS)
+        self.order = order
+        self.priority_files = list(priority_files or [])
+        # Every copy and move is written to an OperationLog so it can be reverted in bulk later;
+        # watch mode keeps adding to the same log. The file is only created by the first transfer.
+        # True (the default) logs to a new file in APP_DATA_DIR/operations; pass an OperationLog
+        # to log elsewhere, or None to not log at all (e.g. benchmarks on throwaway folders).
+        self.operation_log = OperationLog() if operation_log is True else operation_log
+        # Record decisions in a RunJournal so an interrupted run picks up where it stopped
+        self.resumable = resumable
+        self.journal = None
+        # Set by cancel(); the run stops handing out work and saves its journal
+        self.cancel_event = threading.Event()
+        # Names handed out by the scanner, collected while watch() runs its first full pass
+        self.seen_files = None
+        # Stage timings and throughput; snapshots go to metrics_callback at most every metrics_interval seconds
+        self.metrics = RunMetrics()
+        self.metrics_interval = 0.5
+        self.last_metrics_time = 0.0
+
+    def run_parameters(self):
+        # Everything that changes which files a run picks and where they go
+        return {
+            'source_folder': os.path.abspath(self.source_folder),
+            'destination_folder': os.path.abspath(self.destination_folder) if self.destination_folder else '',
+            'category_destinations': self.category_destinations,
+            'classification_key': self.classification_key,
+            'level': self.level,
+            'custom_prompt': self.custom_prompt,
+            'model': self.selected_model,
+            'extensions': sorted(self.selected_extensions),
+            'recursive': self.recursive,
+            'move_files': self.move_files
+        }
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def wait_for_result(self, future, poll_interval=0.2):
+        # Waits for a request future without blocking cancel(): a request can take up to the
+        # read timeout times the retries. False once the run is cancelled.
+        while not self.cancelled:
+            if concurrent.futures.wait([future], timeout=poll_interval).done:
+                return True
+        return False
+
+    def normalize_file_name(self, image_path):
+        file_name_without_extension = os.path.splitext(os.path.basename(image_path))[0]
+        return re.sub(r'\(\d+\)', '', file_name_without_extension).strip()
+
+    def cache_key(self, file_name_without_extension, model=None):
+        return (file_name_without_extension, self.classification_key, self.level, self.custom_prompt, model or self.selected_model)
+
+    def classify_image(self, image_path):
+        return self.classify_batch([image_path])[image_path]
+
+    def classify_batch(self, image_paths):
+        # Returns {image_path: answer}. Images with a thumbnail go to the vision model, documents
+        # with a text snippet are asked about with it; the rest are classified by name.
+        answers = {}
+        for path in image_paths:
+            thumbnail = self.read_result(self.thumbnail_futures.pop(path, None))
+            if thumbnail is not None:
+                answers[path] = self.classify_thumbnail(path, thumbnail)
+                continue
+            snippet = self.read_result(self.snippet_futures.pop(path, None))
+            if snippet:
+                answers[path] = self.classify_snippet(path, snippet)
+        answers.update(self.classify_names([path for path in image_paths if path not in answers]))
+        return answers
+
+    @staticmethod
+    def read_result(future):
+        # The thumbnail or snippet, or None without one; a reader that failed (a crashed worker
+        # process breaks its whole pool) leaves the file to be classified by name
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def classify_names(self, image_paths):
+        # Returns {image_path: answer}, asking about every distinct name once. Each name goes
+        # through the cache, then the embedding pre-filter, then the chat model.
+        names = {path: self.normalize_file_name(path) for path in image_paths}
+        unique_names = list(dict.fromkeys(names.values()))
+        answers = {}
+        if self.cache is not None:
+            for name in unique_names:
+                is_match = self.cache.get(*self.cache_key(name))
+                if is_match is not None:
+                    answers[name] = is_match
+
+        missing = [name for name in unique_names if name not in answers]
+        if self.prefilter is not None and missing:
+            try:
+                answers.update(self.prefilter.decide(missing))
+            except Exception as e:
+                self.status_callback(f"Error: Embedding pre-filter failed: {e}")
+            missing = [name for name in missing if name not in answers]
+        if self.prefilter is not None:
+            for path in image_paths:
+                self.prefilter.forget(names[path])
+
+        if len(missing) > 1:
+            answers.update(self.request_batch_classification(missing))
+
+        # Fall back to one request per name for anything the batch left unanswered
+        for name in missing:
+            if answers.get(name) is None:
+                answers[name] = self.request_classification(name)
+            # Failed or unparseable answers are not cached so they get retried next run
+            if self.cache is not None and answers[name] is not None:
+                self.cache.put(*self.cache_key(name), answers[name])
+
+        return {path: answers.get(names[path]) for path in image_paths}
+
+    def classify_thumbnail(self, image_path, thumbnail):
+        # Identical thumbnails share one cache entry whatever the file is called
+        cache_key = self.cache_key('image:' + hashlib.blake2b(thumbnail, digest_size=16).hexdigest(), self.vision_model)
+        if self.cache is not None:
+            is_match = self.cache.get(*cache_key)
+            if is_match is not None:
+                return is_match
+
+        is_match = self.request_vision_classification(self.normalize_file_name(image_path), thumbnail)
+        if self.cache is not None and is_match is not None:
+            self.cache.put(*cache_key, is_match)
+        return is_match
+
+    def classify_snippet(self, document_path, snippet):
+        # The name stays part of the question, so the cache key holds both
+        name = self.normalize_file_name(document_path)
+        cache_key = self.cache_key(f'text:{name}:' + hashlib.blake2b(snippet.encode('utf-8'), digest_size=16).hexdigest())
+        if self.cache is not None:
+            is_match = self.cache.get(*cache_key)
+            if is_match is not None:
+                return is_match
+
+        is_match = self.request_snippet_classification(name, snippet)
+        if self.cache is not None and is_match is not None:
+            self.cache.put(*cache_key, is_match)
+        return is_match
+
+    @contextmanager
+    def request_timer(self):
+        # Times one model request for the run metrics and the adaptive concurrency limit
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe('http', elapsed)
+            if self.concurrency is not None:
+                self.concurrency.record(elapsed, failed)
+
+    def in_flight_limit(self):
+        return self.concurrency.current if self.concurrency is not None else self.max_in_flight
+
+    def build_instructions(self):
+        # Everything that stays the same for a run (key, level criteria, categories, answer
+        # format) goes into one system message per request kind, built once. The per-file part
+        # comes last, so consecutive requests share a byte-identical prefix the server can keep
+        # in its KV cache instead of re-reading it for every file.
+        criteria = LEVEL_CRITERIA[self.level]
+        if self.category_destinations:
+            categories = self.category_list_text()
+            custom = f" {self.custom_prompt}" if self.custom_prompt else ""
+            answer = " Reply with only the category name, or 'none' if no category fits."
+            instructions = {
+                'name': f"You are given a file name. Pick the one category from {categories} that the file name {criteria}.{custom}{answer}",
+                'snippet': (f"You are given a file name and the start of the file. Pick the one category from {categories} "
+                            f"that its name and content {criteria}.{custom}{answer}"),
+                'vision': f"You are given an image. Pick the one category from {categories} that the image content {criteria}.{custom}{answer}",
+                'batch': (f"For each numbered file name you are given, pick the one category from {categories} "
+                          f"that the file name {criteria}, or 'none' if no category fits.{custom}")
+            }
+            batch_answer = 'where answer is one of the category names or "none".'
+        elif self.custom_prompt:
+            yes_no = " Answer with only yes or no." if self.constrained_decisions else ""
+            instructions = {
+                'name': f"You are given a file name. {self.custom_prompt}{yes_no}",
+                'snippet': f"You are given a file name and the start of the file. {self.custom_prompt}{yes_no}",
+                'vision': f"You are given an image and its file name. {self.custom_prompt}{yes_no}",
+                'batch': f"For each numbered file name you are given, {self.custom_prompt}"
+            }
+            batch_answer = 'where answer is "yes" or "no".'
+        else:
+            instructions = {
+                'name': name_instruction(self.classification_key, self.level),
+                'snippet': (f"You are given a file name and the start of the file. Decide whether its name and content "
+                            f"{criteria} '{self.classification_key}'. Answer with only yes or no."),
+                'vision': f"You are given an image. Decide whether the content of the image {criteria} '{self.classification_key}'. Answer with only yes or no.",
+                'batch': f"For each numbered file name you are given, decide whether it {criteria} '{self.classification_key}'."
+            }
+            batch_answer = 'where answer is "yes" or "no".'
+        instructions['batch'] += (' Reply with only a JSON object of the form {"answers": [{"index": 1, "answer": "..."}, ...]} '
+                                  f'containing one entry per file name, {batch_answer}')
+        return instructions
+
+    def chat_messages(self, kind, content):
+        if self.instructions is None:
+            self.instructions = self.build_instructions()
+        return [{"role": "system", "content": self.instructions[kind]}, {"role": "user", "content": content}]
+
+    def post_chat_completion(self, kind, content, **extra_fields):
+        with self.request_timer():
+            return self.client.chat(self.selected_model, self.chat_messages(kind, content), **extra_fields)
+
+    def category_list_text(self):
+        return ", ".join(f"'{category}'" for category in self.category_destinations)
+
+    def match_category(self, answer):
+        # Maps a model answer onto a configured category, False for "none", None if unclear
+        answer = answer.strip().strip('\'".').lower()
+        if answer == 'none':
+            return False
+        categories = {category.lower(): category for category in self.category_destinations}
+        if answer in categories:
+            return categories[answer]
+        mentioned = [category for lowered, category in categories.items() if lowered in answer]
+        if len(mentioned) == 1:
+            return mentioned[0]
+        if 'none' in answer:
+            return False
+        return None
+
+    def request_batch_classification(self, file_names):
+        with self.metrics.timer('prompt'):
+            prompt = self.batch_prompt(file_names)
+
+        try:
+            message = self.post_chat_completion('batch', prompt, **self.batch_request_fields())
+        except Exception as e:
+            self.status_callback(f"Error: {e}")
+            return {}
+
+        answers = {}
+        with self.metrics.timer('parse'):
+            for number, answer in self.parse_batch_answers(message or '').items():
+                if not 1 <= number <= len(file_names):
+                    continue
+                if self.category_destinations:
+                    answers[file_names[number - 1]] = self.match_category(answer)
+                elif answer in ('yes', 'no'):
+                    answers[file_names[number - 1]] = answer == 'yes'
+        return answers
+
+    def allowed_answers(self):
+        return list(self.category_destinations) + ['none'] if self.category_destinations else ['yes', 'no']
+
+    def batch_request_fields(self):
+        if not self.constrained_decisions:
+            return {"response_format": {"type": "json_object"}}
+        # The schema limits every answer to the allowed values, so the reply needs no repair
+        allowed = self.allowed_answers()
+        schema = {
+            "type": "object",
+            "properties": {"answers": {"type": "array", "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, "answer": {"type": "string", "enum": allowed}},
+                "required": ["index", "answer"]
+            }}},
+            "required": ["answers"]
+        }
+        return {"temperature": 0, "response_format": {"type": "json_schema", "json_schema": {"name": "answers", "schema": schema}}}
+
+    def batch_prompt(self, file_names):
+        return "\n".join(f"{number}. {name}" for number, name in enumerate(file_names, start=1))
+
+    def parse_batch_answers(self, message):
+        # Accepts {"answers": [...]}, a bare [...] list, or either wrapped in extra text; anything
+        # else (including no text at all) answers nothing, so every name is asked on its own
+        try:
+            parsed = json.loads(message)
+        except (TypeError, ValueError):
+            if not isinstance(message, str):
+                return {}
+            match = re.search(r'(\{.*\}|\[.*\])', message, re.DOTALL)
+            if not match:
+                return {}
+            try:
+                parsed = json.loads(match.group(1))
+            except ValueError:
+                return {}
+
+        if isinstance(parsed, dict):
+            parsed = parsed.get('answers', parsed.get('results', []))
+        if not isinstance(parsed, list):
+            return {}
+
+        answers = {}
+        for position, item in enumerate(parsed, start=1):
+            if isinstance(item, dict):
+                number, answer = item.get('index', position), item.get('answer')
+            else:
+                number, answer = position, item
+            if isinstance(answer, bool):
+                answer = 'yes' if answer else 'no'
+            try:
+                answers[int(number)] = str(answer).strip().lower()
+            except (TypeError, ValueError):
+                continue
+        return answers
+
+    def request_classification(self, file_name_without_extension):
+        with self.metrics.timer('prompt'):
+            prompt = self.classification_prompt(file_name_without_extension)
+        return self.ask_model(self.selected_model, 'name', prompt, file_name_without_extension)
+
+    def classification_prompt(self, file_name_without_extension):
+        return f"File name: {file_name_without_extension}"
+
+    def request_snippet_classification(self, file_name_without_extension, snippet):
+        with self.metrics.timer('prompt'):
+            prompt = self.snippet_prompt(file_name_without_extension, snippet)
+        return self.ask_model(self.selected_model, 'snippet', prompt, file_name_without_extension)
+
+    def snippet_prompt(self, file_name_without_extension, snippet):
+        return f"File name: {file_name_without_extension}\nStart of the file:\n---\n{snippet}\n---"
+
+    def request_vision_classification(self, file_name_without_extension, thumbnail):
+        with self.metrics.timer('prompt'):
+            content = self.vision_content(file_name_without_extension, thumbnail)
+        return self.ask_model(self.vision_model, 'vision', content, file_name_without_extension)
+
+    def vision_content(self, file_name_without_extension, thumbnail):
+        image_url = "data:image/jpeg;base64," + base64.b64encode(thumbnail).decode('ascii')
+        return [
+            {"type": "text", "text": f"File name: {file_name_without_extension}"},
+            {"type": "image_url", "image_url": {"url": image_url}}
+        ]
+
+    def ask_model(self, model, kind, content, name=None):
+        # Transport errors are retried by the client; answer_retries re-asks on unclear replies
+        messages = self.chat_messages(kind, content)
+        for attempt in range(self.answer_retries + 1):
+            try:
+                with self.request_timer():
+                    choice = self.client.chat_choice(model, messages, **self.decision_request_fields())
+            except Exception as e:
+                self.status_callback(f"Error: {e}")
+                return None
+
+            with self.metrics.timer('parse'):
+                message = choice['message']['content'] or ''
+                if self.constrained_decisions:
+                    message = json_answer(message)
+                confidence = None
+                if self.category_destinations:
+                    answer = self.match_category(message.strip().lower())
+                else:
+                    confidence = yes_probability(choice.get('logprobs'))
+                    if confidence is not None:
+                        answer = confidence >= LEVEL_CONFIDENCE_THRESHOLDS[self.level]
+                    else:
+                        answer = parse_yes_no(message)
+            if answer is not None:
+                if confidence is not None and name is not None:
+                    self.confidences[name] = round(confidence, 4)
+                return answer
+        return None
+
+    def decision_request_fields(self):
+        if not self.constrained_decisions:
+            return {}
+        # The schema only lets the model write {"answer": <allowed value>}, so a reply cannot
+        # open with "The..." and be cut off by the token cap before it says yes or no
+        schema = {
+            "type": "object",
+            "properties": {"answer": {"type": "string", "enum": self.allowed_answers()}},
+            "required": ["answer"]
+        }
+        fields = {"temperature": 0, "response_format": {"type": "json_schema", "json_schema": {"name": "answer", "schema": schema}}}
+        if self.category_destinations:
+            # Category names can span several tokens; the cap only stops runaway replies
+            return dict(fields, max_tokens=32)
+        # The JSON around the answer takes a few tokens; the yes/no token itself carries the logprobs
+        return dict(fields, max_tokens=8, logprobs=True, top_logprobs=10)
+
+    def destination_index(self, folder):
+        # Indexes the files already in a destination folder the first time it is written to
+        with self.index_lock:
+            if folder not in self.destination_indexes:
+                index = ContentIndex()
+                for file_name in scan_files(folder):
+                    index.add(os.path.join(folder, file_name))
+                self.destination_indexes[folder] = index
+            return self.destination_indexes[folder]
+
+    def reserve_destination_name(self, destination_path):
+        # Picks a free name ("name_1.ext", "name_2.ext", ...) from the in-memory listing instead of
+        # probing the disk. Names compare case-insensitively so case-insensitive file systems
+        # never get a file overwritten. Call with transfer_lock held.
+        folder, file_name = os.path.split(destination_path)
+        if folder not in self.destination_names:
+            self.destination_names[folder] = {entry.name.lower() for entry in os.scandir(folder)}
+        taken = self.destination_names[folder]
+        base, ext = os.path.splitext(file_name)
+        count = 0
+        while file_name.lower() in taken:
+            count += 1
+            file_name = f"{base}_{count}{ext}"
+        taken.add(file_name.lower())
+        return os.path.join(folder, file_name)
+
+    def release_destination_name(self, destination_path):
+        folder, file_name = os.path.split(destination_path)
+        with self.transfer_lock:
+            self.destination_names.get(folder, set()).discard(file_name.lower())
+
+    def folder_device(self, folder):
+        if folder not in self.folder_devices:
+            self.folder_devices[folder] = os.stat(folder).st_dev
+        return self.folder_devices[folder]
+
+    def move_or_copy_file(self, source_path, destination_path):
+        # Returns the path the file was written to, or None when an identical copy already exists.
+        # Listing and hashing run outside transfer_lock, which only guards name reservation.
+        destination_index = None
+        if self.skip_existing_duplicates:
+            destination_index = self.destination_index(os.path.dirname(destination_path))
+            # The source stands in for its copy until the transfer is done, so an identical
+            # file handled meanwhile is already skipped
+            if destination_index.find_or_add(source_path) != source_path:
+                return None
+        with self.transfer_lock:
+            destination_path = self.reserve_destination_name(destination_path)
+            if self.move_files:
+                same_device = self.folder_device(os.path.dirname(source_path)) == self.folder_device(os.path.dirname(destination_path))
+
+        try:
+            with self.metrics.timer('transfer'):
+                if self.move_files:
+                    move_file(source_path, destination_path, same_device)
+                else:
+                    copy_file(source_path, destination_path)
+        except Exception:
+            self.release_destination_name(destination_path)
+            if destination_index is not None:
+                destination_index.discard(source_path)
+            raise
+
+        if destination_index is not None:
+            destination_index.rename(source_path, destination_path)
+        return destination_path
+
+    def transfer_file(self, number, file_name, is_match, confidence, source_path, destination_path):
+        # Runs on the transfer pool; the journal entry is only written once the file is in place.
+        # The operation log and journal are written at once, the callback waits for its turn.
+        report = (None,)
+        try:
+            try:
+                destination_path = self.move_or_copy_file(source_path, destination_path)
+            except Exception as e:
+                report = (self.status_callback, f"Error: Could not {'move' if self.move_files else 'copy'} {file_name}: {e}")
+                return
+            finally:
+                self.transfer_slots.release()
+
+            if destination_path is None:
+                action = 'skipped'
+                report = (self.status_callback, f"Identical file already in destination, skipped: {file_name}")
+            else:
+                action = 'moved' if self.move_files else 'copied'
+                if self.operation_log is not None:
+                    self.operation_log.record(action, source_path, destination_path)
+                report = (self.file_callback, file_name, action, destination_path)
+            if self.journal is not None:
+                self.journal.record(file_name, is_match, action, destination_path, confidence)
+        finally:
+            # Always taken, or every later file would be held back
+            self.report_transfer(number, *report)
+
+    def report_transfer(self, number, callback, *args):
+        with self.report_lock:
+            self.pending_reports[number] = (callback, args)
+            while self.reported_count in self.pending_reports:
+                callback, args = self.pending_reports.pop(self.reported_count)
+                if callback is not None:
+                    callback(*args)
+                self.reported_count += 1
+
+    def flush_reports(self):
+        # After a cancel, transfers that never started leave gaps; report the ones that finished
+        with self.report_lock:
+            for number in sorted(self.pending_reports):
+                callback, args = self.pending_reports[number]
+                if callback is not None:
+                    callback(*args)
+            self.pending_reports.clear()
+
+    def excluded_folders(self):
+        # Destination folders inside the source folder are never scanned
+        return set(self.category_destinations.values()) | {self.destination_folder}
+
+    def scan_source(self, work_queue, file_names=None):
+        # Producer side of the work queue; None marks the end of the scan. file_names replaces
+        # the folder scan when only some files (e.g. new arrivals in watch mode) are classified.
+        try:
+            if file_names is None:
+                scanned_files = scan_files(self.source_folder, self.selected_extensions, self.recursive, self.excluded_folders())
+            else:
+                scanned_files = iter(file_names)
+            if self.order != 'scan' or self.priority_files:
+                with self.metrics.timer('scan'):
+                    scanned_files = iter(self.prioritized(scanned_files))
+            while True:
+                # Only directory reads are timed, not waits on a full work queue
+                with self.metrics.timer('scan'):
+                    file_name = next(scanned_files, None)
+                if file_name is None or self.cancelled:
+                    break
+                if self.journal is not None and file_name in self.journal.completed:
+                    continue
+                if self.seen_files is not None:
+                    self.seen_files.add(file_name)
+                self.scanned_count += 1
+                self.submit_reads(file_name)
+                if not self.put_work(work_queue, file_name):
+                    break
+        finally:
+            self.scan_complete = True
+            self.put_work(work_queue, None)
+
+    def prioritized(self, file_names):
+        # priority_files first, in the order given, then the rest sorted by self.order
+        file_names = list(file_names)
+        if self.order != 'scan':
+            keys = {}
+            for file_name in file_names:
+                try:
+                    stat = os.stat(os.path.join(self.source_folder, file_name))
+                    keys[file_name] = stat.st_size if self.order in ('largest', 'smallest') else stat.st_mtime
+                except OSError:
+                    keys[file_name] = 0
+            file_names.sort(key=keys.get, reverse=self.order in ('newest', 'largest'))
+        if self.priority_files:
+            present = set(file_names)
+            first = [file_name for file_name in dict.fromkeys(self.priority_files) if file_name in present]
+            first_set = set(first)
+            file_names = first + [file_name for file_name in file_names if file_name not in first_set]
+        return file_names
+
+    def start_readers(self):
+        from concurrent.futures import ProcessPoolExecutor
+        if self.vision_model:
+            self.thumbnail_pool = ProcessPoolExecutor()
+        if self.read_documents:
+            # Snippet reads are mostly I/O; a few processes keep PDF parsing off the request threads
+            self.snippet_pool = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+
+    def submit_reads(self, file_name):
+        # Decoding and text extraction start now, well before the file's request is sent
+        extension = os.path.splitext(file_name)[1].lower()
+        file_path = os.path.join(self.source_folder, file_name)
+        try:
+            if self.thumbnail_pool is not None and extension in IMAGE_EXTENSIONS:
+                self.thumbnail_futures[file_path] = self.thumbnail_pool.submit(
+                    load_thumbnail, file_path, self.thumbnail_size, self.thumbnail_folder)
+                return
+            if self.snippet_pool is not None and extension in SNIPPET_EXTENSIONS:
+                self.snippet_futures[file_path] = self.snippet_pool.submit(
+                    load_snippet, file_path, self.snippet_bytes, self.snippet_folder)
+                return
+        except concurrent.futures.BrokenExecutor:
+            # A reader process died, e.g. out of memory; the remaining files are classified by name
+            self.status_callback("Error: A file reader process stopped; classifying the remaining files by name")
+            self.stop_readers(wait=False)
+        if self.prefilter is not None:
+            # Classified by name; the pre-filter embeds it together with its neighbours unless
+            # the cache already has the answer
+            name = self.normalize_file_name(file_path)
+            if self.cache is None or not self.cache.contains(*self.cache_key(name)):
+                self.prefilter.expect(name)
+
+    def drop_reads(self, file_path):
+        # For files that will not be classified; their thumbnail, snippet or pre-filter score
+        # would otherwise stay in memory until the run ends
+        read = False
+        for futures in (self.thumbnail_futures, self.snippet_futures):
+            future = futures.pop(file_path, None)
+            if future is not None:
+                future.cancel()
+                read = True
+        if not read and self.prefilter is not None:
+            self.prefilter.forget(self.normalize_file_name(file_path))
+
+    def stop_readers(self, wait):
+        if self.thumbnail_pool is not None:
+            self.thumbnail_pool.shutdown(wait=wait, cancel_futures=True)
+            self.thumbnail_futures.clear()
+            self.thumbnail_pool = None
+        if self.snippet_pool is not None:
+            self.snippet_pool.shutdown(wait=wait, cancel_futures=True)
+            self.snippet_futures.clear()
+            self.snippet_pool = None
+
+    def put_work(self, work_queue, item):
+        # The queue is bounded in vision and document mode; give up waiting for space once the run is cancelled
+        while True:
+            try:
+                work_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if self.cancelled:
+                    return False
+
+    def next_batch(self, work_queue, numbered_files):
+        # Blocks only until the next file is scanned, so classification starts right away.
+        # Files sent back by the name groups go first and keep their number.
+        batch = []
+        while len(batch) < self.batch_size:
+            if self.requeued_files:
+                batch.append(self.requeued_files.popleft())
+                continue
+            file_name = work_queue.get()
+            if file_name is None:
+                work_queue.put(None)  # Leave the end marker for the next call
+                break
+            batch.append((next(numbered_files), file_name))
+        return batch
+
+    def run(self, file_names=None):
+        # Classifies the whole source folder, or only file_names (paths relative to it)
+        for folder in set(self.category_destinations.values()) or {self.destination_folder}:
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+
+        if self.cache is not None:
+            self.cache.reset_counters()
+        if self.prefilter is not None:
+            self.prefilter.reset()
+        self.metrics = RunMetrics()
+        self.instructions = self.build_instructions()
+        self.scanned_count = 0
+        self.scan_complete = False
+        self.requeued_files.clear()
+
+        # A journal is per run; watch mode turns resumable off after its first run, whose journal is closed
+        self.journal = RunJournal(self.run_parameters()) if self.resumable else None
+        if self.journal is not None and self.journal.completed:
+            self.status_callback(f"Resuming previous run: skipping {len(self.journal.completed)} files already processed")
+
+        # In vision and document mode the queue bounds how many files are read ahead of the requests
+        work_queue = queue.Queue()
+        self.start_readers()
+        if self.vision_model or self.read_documents:
+            work_queue = queue.Queue(maxsize=self.max_in_flight * self.batch_size * 2)
+        scanner = threading.Thread(target=self.scan_source, args=(work_queue, file_names), daemon=True)
+        scanner.start()
+
+        # Requests run in a bounded pool; results are consumed in submission order so
+        # progress, status and copy signals keep the same order as a serial run.
+        numbered_files = itertools.count(1)
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        self.transfer_pool = ThreadPoolExecutor(max_workers=self.transfer_workers)
+        self.transfer_slots = threading.Semaphore(self.transfer_workers * 4)
+        self.pending_reports.clear()
+        self.transfer_count = self.reported_count = 0
+        self.destination_names.clear()
+        self.folder_devices.clear()
+        completed = False
+        try:
+            while not self.cancelled:
+                while len(pending) < self.in_flight_limit() and not self.cancelled:
+                    batch = self.next_batch(work_queue, numbered_files)
+                    if not batch:
+                        break
+                    pending.append((batch, self.submit_classification(executor, batch)))
+
+                if not pending:
+                    break
+                self.metrics.set_gauges(concurrency_limit=self.in_flight_limit(), in_flight=len(pending),
+                                        queue_depth=work_queue.qsize())
+
+                batch, future = pending.popleft()
+                if future is not None and not self.wait_for_result(future):
+                    break  # Unhandled results are not journaled and will be redone on resume
+                results = future.result() if future else {}
+                if self.cancelled:
+                    break
+                for index, file_name in batch:
+                    file_path = os.path.join(self.source_folder, file_name)
+                    is_match = results.get(file_path)
+                    if file_path in self.content_leaders:
+                        # Leaders come first in scan order, so their decision is already known
+                        is_match = self.content_decisions.get(self.content_leaders.pop(file_path))
+                    else:
+                        if self.name_groups is not None and self.name_groups.requeue(file_path):
+                            self.requeued_files.append((index, file_name))
+                            continue
+                        if self.name_groups is not None:
+                            is_match = self.name_groups.resolve(
+                                file_path, is_match, self.confidences.get(self.normalize_file_name(file_path)))
+                        if self.source_index is not None:
+                            self.content_decisions[file_path] = is_match
+                    self.handle_classification_result(index, file_name, is_match)
+            completed = not self.cancelled
+        finally:
+            # After a cancel or error, requests still in flight finish in the background and are dropped
+            executor.shutdown(wait=completed, cancel_futures=True)
+            # Transfers already started always finish, so no half-written file is left behind
+            self.transfer_pool.shutdown(wait=True, cancel_futures=not completed)
+            self.flush_reports()
+            self.stop_readers(wait=completed)
+            if self.journal is not None:
+                self.journal.close(finished=completed)
+            if self.operation_log is not None:
+                self.operation_log.close()
+
+        self.emit_metrics(force=True)
+        if self.cancelled:
+            self.status_callback("Classification cancelled.")
+            return
+
+        if self.cache is not None:
+            self.status_callback(f"Cache: {self.cache.hits} hits, {self.cache.misses} misses")
+        if self.prefilter is not None:
+            self.status_callback(f"Pre-filter: {self.prefilter.accepted} accepted, {self.prefilter.rejected} rejected, "
+                                 f"{self.prefilter.ambiguous} sent to the model")
+        if self.source_index is not None:
+            self.status_callback(f"Duplicates: {self.duplicate_count} files reused the decision of an identical file")
+        if len(self.client.backends) > 1:
+            self.status_callback(f"Servers: {self.client.backend_summary()}")
+        first_decision_seconds = self.metrics.snapshot()['first_decision_seconds']
+        if first_decision_seconds is not None:
+            self.status_callback(f"Time to first decision: {first_decision_seconds:.2f}s")
+        if self.name_groups is not None:
+            self.status_callback(f"Name groups: {self.name_groups.reused} files reused the decision of a similar name, "
+                                 f"{self.name_groups.split} groups classified file by file after a spot check")
+
+    def preview(self, sample_size=200, seed=None):
+        # Dry run: classifies a stratified sample (see stratified_sample) and estimates what a
+        # full run with the same settings would do. Nothing is copied, moved or journaled;
+        # answers do go into the result cache, so the full run starts with them.
+        if self.prefilter is not None:
+            self.prefilter.reset()
+        self.metrics = RunMetrics()
+        self.instructions = self.build_instructions()
+        start = time.perf_counter()
+        file_names = list(scan_files(self.source_folder, self.selected_extensions, self.recursive, self.excluded_folders()))
+        scan_seconds = time.perf_counter() - start
+        # Names without a stem (camera and date-only names) each form a cluster of their own
+        sample = stratified_sample(file_names, sample_size, random.Random(seed),
+                                   lambda file_name: name_stem(self.normalize_file_name(file_name)) or file_name)
+        self.status_callback(f"Preview: classifying {len(sample)} of {len(file_names)} files...")
+
+        start = time.perf_counter()
+        paths = [os.path.join(self.source_folder, file_name) for file_name, _ in sample]
+        batches = [paths[offset:offset + self.batch_size] for offset in range(0, len(paths), self.batch_size)]
+        decisions = {}
+        self.start_readers()
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            for file_name, _ in sample:
+                self.submit_reads(file_name)
+            futures = [executor.submit(self.classify_batch, batch) for batch in batches]
+            for done, future in enumerate(futures, start=1):
+                if not self.wait_for_result(future):
+                    return None
+                decisions.update(future.result())
+                self.progress_callback(int(done / len(futures) * 100))
+        finally:
+            executor.shutdown(wait=not self.cancelled, cancel_futures=True)
+            self.stop_readers(wait=not self.cancelled)
+        seconds_per_file = (time.perf_counter() - start) / len(sample) if sample else 0.0
+
+        decided = [(file_name, weight, decisions.get(os.path.join(self.source_folder, file_name)))
+                   for file_name, weight in sample]
+        decided = [(file_name, weight, decision) for file_name, weight, decision in decided if decision is not None]
+        total_weight = sum(weight for _, weight, _ in decided)
+        match_rate = sum(weight for _, weight, decision in decided if decision) / total_weight if total_weight else 0.0
+        margin = 1.96 * math.sqrt(match_rate * (1 - match_rate) / len(decided)) if decided else 1.0
+        categories = {}
+        if self.category_destinations and total_weight:
+            for category in self.category_destinations:
+                share = sum(weight for _, weight, decision in decided if decision == category) / total_weight
+                categories[category] = round(share * len(file_names))
+
+        summary = {
+            'files': len(file_names),
+            'sampled': len(sample),
+            'unclear': len(sample) - len(decided),
+            'match_rate': round(match_rate, 4),
+            'margin': round(margin, 4),
+            'estimated_matches': round(match_rate * len(file_names)),
+            'categories': categories,
+            'seconds_per_file': round(seconds_per_file, 4),
+            'projected_seconds': round(scan_seconds + seconds_per_file * len(file_names), 1),
+            'samples': [{'file': file_name, 'decision': decisions.get(os.path.join(self.source_folder, file_name))}
+                        for file_name, _ in sample]
+        }
+        for item in summary['samples']:
+            decision = item['decision']
+            if decision is None:
+                label = 'unclear'
+            elif decision is True or decision is False:
+                label = 'match' if decision else 'no match'
+            else:
+                label = decision  # Category name
+            self.status_callback(f"Sample ({label}): {item['file']}")
+        projected = time.strftime('%H:%M:%S', time.gmtime(summary['projected_seconds']))
+        self.status_callback(f"Preview: about {match_rate:.0%} of {len(file_names)} files match "
+                             f"(±{margin:.0%}, ~{summary['estimated_matches']} files); a full run would take about {projected}")
+        return summary
+
+    def watch(self, settle_seconds=2.0, poll_interval=2.0, include_existing=True):
+        # Runs until cancel(): optionally a normal run over the files already there, then one
+        # run per group of new arrivals. Arrivals are sent at low priority so other users of
+        # the same Ollama server are not starved.
+        watcher = FolderWatcher(self.source_folder, self.selected_extensions, self.recursive,
+                                self.excluded_folders(), settle_seconds, poll_interval)
+        low_priority = self.client.low_priority
+        try:
+            if include_existing:
+                # Files arriving during this run may be scanned by it; they must not be handled twice
+                self.seen_files = set()
+                self.run()
+                watcher.mark_known(self.seen_files)
+                self.seen_files = None
+                if self.cancelled:
+                    return
+            # Arrivals are few at a time; journals are only worth keeping for the big first run
+            self.resumable = False
+            self.client.low_priority = True
+            mode = "file system events" if watcher.observer is not None else f"polling every {poll_interval:g}s"
+            self.status_callback(f"Watching {self.source_folder} for new files ({mode})...")
+            while not self.cancel_event.wait(min(poll_interval, settle_seconds) if watcher.pending else poll_interval):
+                arrivals = watcher.poll()
+                if arrivals:
+                    self.status_callback(f"{len(arrivals)} new file(s) found")
+                    self.run(arrivals)
+        finally:
+            self.seen_files = None
+            self.client.low_priority = low_priority
+            watcher.stop()
+
+    def submit_classification(self, executor, batch):
+        # Nothing to classify when a file would be copied onto itself
+        file_paths = []
+        for _, file_name in batch:
+            file_path = os.path.join(self.source_folder, file_name)
+            if file_path == self.default_destination_path(file_name):
+                self.drop_reads(file_path)
+            else:
+                file_paths.append(file_path)
+        if self.source_index is not None:
+            unique_paths = []
+            for file_path in file_paths:
+                leader = self.source_index.find_or_add(file_path)
+                if leader == file_path:
+                    unique_paths.append(file_path)
+                else:
+                    self.content_leaders[file_path] = leader
+                    self.duplicate_count += 1
+                    self.drop_reads(file_path)
+            file_paths = unique_paths
+        if self.name_groups is not None:
+            classified_paths = []
+            for file_path in file_paths:
+                # Images judged by their thumbnail and documents read for content are not grouped by name
+                if (file_path in self.thumbnail_futures or file_path in self.snippet_futures
+                        or self.name_groups.assign(file_path, name_stem(self.normalize_file_name(file_path)))):
+                    classified_paths.append(file_path)
+                else:
+                    self.drop_reads(file_path)  # Reuses the decision of its group
+            file_paths = classified_paths
+        if not file_paths:
+            return None
+        return executor.submit(self.classify_batch, file_paths)
+
+    def default_destination_path(self, file_name):
+        # Files found in subfolders land directly in the destination folder
+        return os.path.join(self.destination_folder, os.path.basename(file_name))
+
+    def emit_metrics(self, force=False):
+        now = time.monotonic()
+        if force or now - self.last_metrics_time >= self.metrics_interval:
+            self.last_metrics_time = now
+            self.metrics_callback(self.metrics.snapshot())
+
+    def handle_classification_result(self, index, file_name, is_match):
+        self.metrics.file_done(max(self.scanned_count, index), self.scan_complete)
+        self.emit_metrics()
+        file_path = os.path.join(self.source_folder, file_name)
+        destination_path = self.default_destination_path(file_name)
+        confidence = self.confidences.get(self.normalize_file_name(file_path))
+
+        if file_path == destination_path:
+            self.status_callback(f"Skipping {file_name}: Source and destination are the same.")
+            return
+
+        if is_match and self.category_destinations:
+            # is_match holds the category the model picked
+            destination_path = os.path.join(self.category_destinations[is_match], os.path.basename(file_name))
+            if destination_path == file_path:
+                self.status_callback(f"Skipping {file_name}: Source and destination are the same.")
+                return
+
+        if is_match:
+            # Handed to the transfer pool; copy signals arrive when each transfer finishes
+            self.transfer_slots.acquire()
+            self.transfer_pool.submit(self.transfer_file, self.transfer_count, file_name, is_match, confidence,
+                                      file_path, destination_path)
+            self.transfer_count += 1
+        elif self.journal is not None:
+            self.journal.record(file_name, is_match, confidence=confidence)
+
+        # The total keeps growing until the scanner has finished
+        total_files = max(self.scanned_count, index)
+        total_label = f"{total_files}" if self.scan_complete else f"{total_files}+"
+        self.progress_callback(int((index / total_files) * 100))
+        self.status_callback(f"Processing {index}/{total_label}: {file_name}")
@@ -0,0 +1,328 @@
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# Thin HTTP layer over one or more inference servers. One OllamaClient keeps a pooled
+# keep-alive session, applies connect/read timeouts and retries transient failures with
+# jittered exponential backoff. With several servers (Ollama instances, or OpenAI-compatible
+# servers such as llama.cpp or vLLM) every request goes to the healthy server with the fewest
+# requests in flight; servers that keep failing are ejected and re-admitted once a health
+# check passes. requests is imported when the first client is created.
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+
+# HTTP statuses worth retrying: rate limiting and server-side failures (e.g. model loading)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Prefix marking a server that only speaks the OpenAI API, e.g. "openai:http://localhost:8080"
+OPENAI_PREFIX = "openai:"
+
+
+class OllamaError(Exception):
+    pass
+
+
+def parse_backends(base_url):
+    # Accepts a URL, a comma separated list of URLs or a list of them; raises OllamaError for
+    # one that is not an http(s) URL
+    urls = base_url.split(',') if isinstance(base_url, str) else base_url
+    backends = [Backend(url.strip()) for url in urls if url.strip()]
+    return backends or [Backend(DEFAULT_BASE_URL)]
+
+
+def normalize_url(url):
+    # "localhost:11434" is read as http://localhost:11434
+    if '://' not in url:
+        url = 'http://' + url
+    parts = urlsplit(url)
+    try:
+        parts.port  # Raises for a port that is not a number
+    except ValueError:
+        parts = None
+    if parts is None or parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise OllamaError(f"Invalid server URL: {url}")
+    return url.rstrip('/')
+
+
+# Backend Class
+class Backend:
+    # One inference server and its dispatch state; guarded by the client's dispatch_lock
+    def __init__(self, url):
+        self.openai_only = url.startswith(OPENAI_PREFIX)
+        self.base_url = normalize_url(url[len(OPENAI_PREFIX):] if self.openai_only else url)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0  # Consecutive failed requests
+        self.ejected_until = None  # monotonic time; None while the backend takes requests
+        self.ejections = 0
+        self.missing_models = set()  # Models this server answered 404 for
+
+    def __str__(self):
+        return self.base_url
+
+
+# OllamaClient Class
+class OllamaClient:
+    def __init__(self, base_url=DEFAULT_BASE_URL, pool_size=10, connect_timeout=5.0, read_timeout=120.0,
+                 retries=2, backoff=0.5, low_priority=False, eject_after=3, eject_seconds=5.0, max_eject_seconds=60.0,
+                 health_interval=2.0, keep_alive='30m', outage_wait=60.0):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.requests = requests
+        self.backends = parse_backends(base_url)
+        self.base_url = self.backends[0].base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        # How long Ollama keeps the model loaded after a native API request (/api/generate from
+        # preload(), /api/embed); None leaves it to the server. Ollama's OpenAI-compatible
+        # endpoint, used for chat, does not read keep_alive and follows OLLAMA_KEEP_ALIVE instead.
+        self.keep_alive = keep_alive
+
+        # Keep-alive connections are reused across calls; size the pool to the request concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.backends), pool_maxsize=max(1, pool_size))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Least-outstanding-requests dispatch. A backend with eject_after failures in a row sits
+        # out for eject_seconds (doubling per ejection up to max_eject_seconds) and comes back
+        # once a health check succeeds.
+        self.dispatch_lock = threading.Lock()
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.health_interval = health_interval
+        # While every server that could take a request is ejected, requests wait up to
+        # outage_wait seconds for one to be re-admitted instead of failing at once
+        self.outage_wait = outage_wait
+        self.closed = threading.Event()
+        if len(self.backends) > 1:
+            threading.Thread(target=self.health_loop, daemon=True).start()
+
+        # Low priority (watch mode): one request at a time, and after a reply much slower than
+        # the fastest one seen (the model is busy with someone else) wait as long as that reply
+        # took, so interactive users of the same server are served first
+        self.low_priority = low_priority
+        self.priority_lock = threading.Lock()
+        self.fastest_reply = None
+        self.yield_delay = 0.0
+
+    def request(self, method, path, openai_path=None, backend=None, **kwargs):
+        # openai_path is used on OpenAI-only servers, which are skipped without one; backend
+        # pins the request to one server
+        if not self.low_priority:
+            return self.send(method, path, openai_path, backend, **kwargs)
+        with self.priority_lock:
+            time.sleep(self.yield_delay)
+            start = time.monotonic()
+            try:
+                return self.send(method, path, openai_path, backend, **kwargs)
+            finally:
+                elapsed = time.monotonic() - start
+                # The baseline creeps up slowly so one lucky reply does not make every later one look slow
+                self.fastest_reply = elapsed if self.fastest_reply is None else min(self.fastest_reply * 1.05, elapsed)
+                self.yield_delay = elapsed if elapsed > 2 * self.fastest_reply else 0.0
+
+    def acquire_backend(self, openai_path, model, tried, deadline):
+        # Healthy backend with the fewest requests in flight, preferring ones not tried yet. When
+        # all usable backends are ejected, waits until one is re-admitted or deadline passes.
+        while True:
+            with self.dispatch_lock:
+                usable = [backend for backend in self.backends
+                          if (openai_path or not backend.openai_only) and model not in backend.missing_models]
+                candidates = [backend for backend in usable if backend.ejected_until is None]
+                if candidates:
+                    return self.take_backend(candidates, tried)
+            if not usable or time.monotonic() >= deadline or self.closed.is_set():
+                return None
+            self.closed.wait(min(0.25, max(0.0, deadline - time.monotonic())))
+
+    def take_backend(self, candidates, tried):
+        # Call with dispatch_lock held
+        untried = [backend for backend in candidates if backend not in tried]
+        backend = min(untried or candidates, key=lambda candidate: (candidate.in_flight, candidate.requests))
+        backend.in_flight += 1
+        backend.requests += 1
+        return backend
+
+    def release_backend(self, backend, failed):
+        with self.dispatch_lock:
+            backend.in_flight -= 1
+            if not failed:
+                backend.failures = 0
+                return
+            backend.failures += 1
+            # The only backend is never ejected; retries and backoff are all that can help then
+            if len(self.backends) > 1 and backend.failures >= self.eject_after and backend.ejected_until is None:
+                self.eject(backend)
+
+    def eject(self, backend):
+        # Call with dispatch_lock held
+        backend.ejections += 1
+        backend.ejected_until = time.monotonic() + min(self.max_eject_seconds, self.eject_seconds * 2 ** (backend.ejections - 1))
+
+    def send(self, method, path, openai_path=None, pinned_backend=None, **kwargs):
+        model = (kwargs.get('json') or {}).get('model')
+        last_error = None
+        tried = set()
+        outage_deadline = time.monotonic() + self.outage_wait  # One wait per request, not per attempt
+        for attempt in range(self.retries + 1):
+            if pinned_backend is None:
+                backend = self.acquire_backend(openai_path, model, tried, outage_deadline)
+                if backend is None:
+                    break
+            else:
+                backend = pinned_backend
+                with self.dispatch_lock:
+                    backend.in_flight += 1
+                    backend.requests += 1
+            if backend in tried:
+                # Full jitter keeps parallel workers from retrying in lockstep; a fresh backend is tried at once
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            tried.add(backend)
+
+            url = backend.base_url + (openai_path if backend.openai_only else path)
+            request_kwargs = kwargs
+            if self.keep_alive is not None and model and not backend.openai_only and path.startswith('/api/'):
+                # Only Ollama's native endpoints read it, and OpenAI-only servers may reject unknown fields
+                request_kwargs = dict(kwargs, json=dict(kwargs['json'], keep_alive=self.keep_alive))
+            failed = True
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **request_kwargs)
+                if response.status_code in RETRY_STATUSES:
+                    last_error = OllamaError(f"{backend} returned HTTP {response.status_code}: {response.text[:200]}")
+                    continue
+                failed = False
+            except (self.requests.exceptions.ConnectionError, self.requests.exceptions.Timeout) as e:
+                last_error = OllamaError(f"Cannot reach {backend}: {e}")
+                continue
+            except self.requests.exceptions.RequestException as e:
+                # Not transient (e.g. an invalid URL or header); retrying cannot help
+                raise OllamaError(f"Request to {backend} failed: {e}")
+            finally:
+                self.release_backend(backend, failed)
+
+            if response.status_code == 404 and model and pinned_backend is None and len(self.backends) > 1:
+                # This server does not have the model; another one may
+                with self.dispatch_lock:
+                    backend.missing_models.add(model)
+                last_error = OllamaError(f"{backend} does not serve model '{model}'")
+                continue
+            if response.status_code != 200:
+                raise OllamaError(f"{backend} returned HTTP {response.status_code}: {response.text[:200]}")
+            try:
+                return response.json()
+            except ValueError:
+                raise OllamaError(f"{backend} returned invalid JSON: {response.text[:200]}")
+        raise last_error or OllamaError("No inference server is available" + (f" for model '{model}'" if model else ""))
+
+    def health_loop(self):
+        # Re-admits ejected backends whose cool-down has passed once they answer a model listing
+        while not self.closed.wait(self.health_interval):
+            now = time.monotonic()
+            with self.dispatch_lock:
+                due = [backend for backend in self.backends if backend.ejected_until is not None and backend.ejected_until <= now]
+            for backend in due:
+                healthy = self.check_health(backend)
+                with self.dispatch_lock:
+                    if healthy:
+                        backend.ejected_until = None
+                        backend.failures = 0
+                        backend.missing_models.clear()  # Models may have been pulled meanwhile
+                    else:
+                        self.eject(backend)
+
+    def check_health(self, backend):
+        path = '/v1/models' if backend.openai_only else '/api/tags'
+        try:
+            return self.session.get(backend.base_url + path, timeout=self.timeout[0]).status_code == 200
+        except self.requests.exceptions.RequestException:
+            return False
+
+    def chat(self, model, messages, **extra_fields):
+        # OpenAI-compatible chat completion, returns the content of the first choice
+        return self.chat_choice(model, messages, **extra_fields)['message']['content']
+
+    def chat_choice(self, model, messages, **extra_fields):
+        # Returns the whole first choice, including 'logprobs' when they were requested
+        data = {"model": model, "messages": messages}
+        data.update(extra_fields)
+        result = self.request('POST', '/v1/chat/completions', '/v1/chat/completions', json=data)
+        try:
+            choice = result['choices'][0]
+            if 'content' in choice['message']:
+                return choice
+        except (KeyError, IndexError, TypeError):
+            pass
+        raise OllamaError(f"Unexpected chat response: {str(result)[:200]}")
+
+    def preload(self, model):
+        # Loads the model on every server at once, so the first classification does not pay
+        # for the load. Returns the seconds the slowest server took; raises if none loaded it.
+        def load(backend):
+            try:
+                if backend.openai_only:
+                    # No load endpoint in the OpenAI API; a one-token reply has the same effect
+                    self.request('POST', '/v1/chat/completions', '/v1/chat/completions', backend=backend,
+                                 json={"model": model, "messages": [{"role": "user", "content": "Hi"}], "max_tokens": 1})
+                else:
+                    # A generate request without a prompt only loads the model (keep_alive is added by send)
+                    self.request('POST', '/api/generate', backend=backend, json={"model": model})
+                return None
+            except OllamaError as e:
+                return e
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as pool:
+            errors = list(pool.map(load, self.backends))
+        if all(errors):
+            raise errors[0]
+        return time.monotonic() - start
+
+    def embed(self, model, texts):
+        result = self.request('POST', '/api/embed', '/v1/embeddings', json={"model": model, "input": texts})
+        try:
+            if 'data' in result:
+                # OpenAI format
+                return [item['embedding'] for item in sorted(result['data'], key=lambda item: item.get('index', 0))]
+            return result['embeddings']
+        except (KeyError, TypeError):
+            raise OllamaError(f"Unexpected embedding response: {str(result)[:200]}")
+
+    def list_models(self):
+        # Models of every reachable server, in server order and without duplicates
+        models = []
+        last_error = None
+        for backend in self.backends:
+            try:
+                result = self.request('GET', '/api/tags', '/v1/models', backend=backend)
+            except OllamaError as e:
+                last_error = e
+                continue
+            if 'data' in result:
+                names = [model['id'] for model in result.get('data', [])]
+            else:
+                names = [model['name'] for model in result.get('models', [])]
+            models.extend(name for name in names if name not in models)
+        if not models and last_error is not None:
+            raise last_error
+        return models
+
+    def backend_summary(self):
+        with self.dispatch_lock:
+            return ", ".join(f"{backend}: {backend.requests} requests" + (" (ejected)" if backend.ejected_until is not None else "")
+                             for backend in self.backends)
+
+    def close(self):
+        self.closed.set()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
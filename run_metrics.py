@@ -0,0 +1,191 @@
+import csv
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Per-stage timing for a classification run. The pipeline wraps its hot paths (scan, prompt
+# build, HTTP round-trip, response parse, file transfer) in RunMetrics.timer(); durations are
+# aggregated into fixed histogram buckets, so memory stays constant however many files run.
+
+# Upper bounds in seconds of the histogram buckets, the last bucket catches everything above
+BUCKET_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stages in pipeline order, used to order reports
+STAGES = ('scan', 'prompt', 'http', 'parse', 'transfer')
+
+# Files/sec and ETA are computed over this many recent seconds, so they follow changes in speed
+THROUGHPUT_WINDOW = 30.0
+
+
+# StageHistogram Class
+class StageHistogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for position, bound in enumerate(BUCKET_BOUNDS):
+            if seconds <= bound:
+                self.buckets[position] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the requested rank (the maximum for the last bucket)
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for position, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[position], self.max) if position < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 6),
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.50) * 1000, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000, 3),
+            'p99_ms': round(self.quantile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3)
+        }
+
+
+# RunMetrics Class
+class RunMetrics:
+    # Thread-safe: request workers, the scanner and the result loop all record into one instance
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.start_time = time.monotonic()
+        self.processed = 0
+        self.total = 0
+        self.total_known = False
+        self.recent = deque()  # (monotonic time, processed) samples inside THROUGHPUT_WINDOW
+        self.gauges = {}  # Current values such as the concurrency limit and queue depth
+        self.first_decision_seconds = None  # Time to first decision, includes a cold model load
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = StageHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def set_gauges(self, **values):
+        with self.lock:
+            self.gauges.update(values)
+
+    def file_done(self, total, total_known):
+        # total keeps growing while the scanner is still running
+        now = time.monotonic()
+        with self.lock:
+            self.processed += 1
+            if self.first_decision_seconds is None:
+                self.first_decision_seconds = now - self.start_time
+            self.total = max(total, self.processed)
+            self.total_known = total_known
+            self.recent.append((now, self.processed))
+            while len(self.recent) > 2 and now - self.recent[0][0] > THROUGHPUT_WINDOW:
+                self.recent.popleft()
+
+    def files_per_second(self):
+        with self.lock:
+            if len(self.recent) >= 2 and self.recent[-1][0] > self.recent[0][0]:
+                (first_time, first_count), (last_time, last_count) = self.recent[0], self.recent[-1]
+                return (last_count - first_count) / (last_time - first_time)
+            elapsed = time.monotonic() - self.start_time
+            return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        files_per_second = self.files_per_second()
+        with self.lock:
+            remaining = self.total - self.processed
+            eta_seconds = None
+            if self.total_known and files_per_second > 0:
+                eta_seconds = round(remaining / files_per_second, 1)
+            stages = {name: self.stages[name].summary() for name in self.ordered_stages()}
+            return {
+                'elapsed_seconds': round(time.monotonic() - self.start_time, 3),
+                'processed': self.processed,
+                'total': self.total,
+                'total_known': self.total_known,
+                'files_per_second': round(files_per_second, 2),
+                'eta_seconds': eta_seconds,
+                'first_decision_seconds': round(self.first_decision_seconds, 3) if self.first_decision_seconds is not None else None,
+                'gauges': dict(self.gauges),
+                'stages': stages
+            }
+
+    def ordered_stages(self):
+        return [name for name in STAGES if name in self.stages] + sorted(set(self.stages) - set(STAGES))
+
+    def to_csv_rows(self):
+        snapshot = self.snapshot()
+        columns = ['stage', 'count', 'total_seconds', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+        rows = [columns]
+        for name, summary in snapshot['stages'].items():
+            rows.append([name] + [summary[column] for column in columns[1:]])
+        return rows
+
+    def to_prometheus(self, prefix='ai_file_filter'):
+        # Prometheus text exposition format, one histogram per stage
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_files_processed_total Files handled in this run.",
+            f"# TYPE {prefix}_files_processed_total counter",
+            f"{prefix}_files_processed_total {snapshot['processed']}",
+            f"# HELP {prefix}_files_per_second Recent classification throughput.",
+            f"# TYPE {prefix}_files_per_second gauge",
+            f"{prefix}_files_per_second {snapshot['files_per_second']}"
+        ]
+        if snapshot['first_decision_seconds'] is not None:
+            lines += [f"# HELP {prefix}_first_decision_seconds Time from run start to the first decision.",
+                      f"# TYPE {prefix}_first_decision_seconds gauge",
+                      f"{prefix}_first_decision_seconds {snapshot['first_decision_seconds']}"]
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        lines += [
+            f"# HELP {prefix}_stage_duration_seconds Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_duration_seconds histogram"
+        ]
+        with self.lock:
+            for name in self.ordered_stages():
+                histogram = self.stages[name]
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKET_BOUNDS, histogram.buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {histogram.total:.6f}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path):
+        # The format follows the extension: .csv, .prom/.txt (Prometheus) or JSON otherwise
+        lowered = path.lower()
+        with open(path, 'w', encoding='utf-8', newline='') as report_file:
+            if lowered.endswith('.csv'):
+                csv.writer(report_file).writerows(self.to_csv_rows())
+            elif lowered.endswith(('.prom', '.txt')):
+                report_file.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), report_file, indent=2)
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import file_filter_core  # noqa: E402
+from file_filter_core import FileClassifier  # noqa: E402
+from mock_ollama_server import MockOllamaServer  # noqa: E402
+from ollama_client import OllamaClient  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def app_data_dir(tmp_path, monkeypatch):
+    # Caches, journals and operation logs go to a temporary folder instead of ~/.ai_file_filter
+    folder = tmp_path / 'app_data'
+    monkeypatch.setattr(file_filter_core, 'APP_DATA_DIR', str(folder))
+    return folder
+
+
+# Pipeline tests run against the mock server from benchmarks/, which answers deterministically
+# from the file name
+
+@pytest.fixture
+def server():
+    server = MockOllamaServer(latency=0.0, match_rate=0.5).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def source_folder(tmp_path):
+    folder = tmp_path / 'source'
+    folder.mkdir()
+    for number in range(40):
+        (folder / f'file_{number}.txt').write_text(f'content {number}')
+    (folder / 'ignored.bin').write_text('not a selected extension')
+    return folder
+
+
+@pytest.fixture
+def matching(server):
+    # Sorted names of the .txt files in folder the mock server gives answer for
+    def matching(folder, answer='yes', categories=None):
+        return sorted(name for name in os.listdir(folder) if name.endswith('.txt')
+                      and server.answer_for(os.path.splitext(name)[0], categories) == answer)
+    return matching
+
+
+@pytest.fixture
+def classify(server):
+    # Runs a FileClassifier over the .txt files of source_folder; returns the (file name, action)
+    # pairs of its file callback and its status messages
+    def classify(source_folder, destination_folder, classifier_class=FileClassifier, move_files=False, **options):
+        copied, messages = [], []
+        client = OllamaClient(server.base_url)
+        try:
+            classifier = classifier_class(
+                str(source_folder), str(destination_folder), 'cats', 3, move_files, 'mistral:latest', ['.txt'],
+                client=client, status_callback=messages.append,
+                file_callback=lambda name, action, path: copied.append((name, action)), **options
+            )
+            classifier.run()
+        finally:
+            client.close()
+        return copied, messages
+    return classify
@@ -0,0 +1,32 @@
+from file_filter_core import AdaptiveLimit
+
+
+def test_grows_while_replies_stay_fast():
+    limit = AdaptiveLimit(8)
+    assert limit.current == 1
+    for _ in range(60):
+        limit.record(0.1)
+    assert limit.current == 8
+    limit.record(0.1)
+    assert limit.current == 8  # Never above the maximum
+
+
+def test_shrinks_on_slow_replies_and_failures():
+    limit = AdaptiveLimit(8, initial=8)
+    limit.record(0.1)
+    limit.record(0.5)
+    assert limit.limit < 8
+    limit.record(0.1, failed=True)
+    assert limit.current == 3
+    for _ in range(10):
+        limit.record(0.1, failed=True)
+    assert limit.current == 1  # Never below the minimum
+
+
+def test_baseline_follows_a_slower_model():
+    limit = AdaptiveLimit(8, initial=4)
+    limit.record(0.1)
+    for _ in range(2000):
+        limit.record(0.12)
+    # 0.12 s is no longer slow compared with the drifted baseline, so the limit has grown again
+    assert limit.current == 8
@@ -0,0 +1,36 @@
+import math
+
+import pytest
+
+from file_filter_core import parse_yes_no, yes_probability
+
+
+@pytest.mark.parametrize('message, expected', [
+    ("Yes", True),
+    ("no.", False),
+    ("The answer is yes", True),
+    ("I would say no", False),
+    ("not yes", None),
+    ("I don't know", None),
+    ("It could be yes or no", None),
+    ("", None),
+])
+def test_parse_yes_no(message, expected):
+    assert parse_yes_no(message) is expected
+
+
+def logprobs(*candidates):
+    return {'content': [{'token': candidates[0][0], 'logprob': math.log(candidates[0][1]),
+                         'top_logprobs': [{'token': token, 'logprob': math.log(p)} for token, p in candidates]}]}
+
+
+def test_yes_probability():
+    assert yes_probability(logprobs(('yes', 0.6), ('no', 0.2))) == pytest.approx(0.75)
+    # Tokens are compared case-insensitively and without surrounding spaces
+    assert yes_probability(logprobs((' No', 0.9), ('Yes', 0.1))) == pytest.approx(0.1)
+
+
+def test_yes_probability_without_usable_logprobs():
+    assert yes_probability(None) is None
+    assert yes_probability({}) is None
+    assert yes_probability(logprobs(('maybe', 0.9))) is None
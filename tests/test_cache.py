@@ -0,0 +1,44 @@
+from file_filter_core import ClassificationCache
+
+
+def test_classification_cache_round_trip(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ClassificationCache(path)
+    # Category names that look like numbers or booleans come back as the strings they were
+    decisions = {'yes.jpg': True, 'no.jpg': False, 'year.jpg': '2023', 'other.jpg': '1'}
+    for name, decision in decisions.items():
+        cache.put(name, 'key', 3, None, 'model', decision)
+    cache.close()
+
+    cache = ClassificationCache(path)
+    for name, decision in decisions.items():
+        assert cache.get(name, 'key', 3, None, 'model') == decision
+        assert type(cache.get(name, 'key', 3, None, 'model')) is type(decision)
+    assert cache.get('yes.jpg', 'key', 4, None, 'model') is None
+    assert cache.get('missing.jpg', 'key', 3, None, 'model') is None
+    assert (cache.hits, cache.misses) == (8, 2)
+    cache.close()
+
+
+def test_classification_cache_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ClassificationCache(path, max_entries=2, touch_batch=1)
+    for name in ('a', 'b', 'c'):
+        cache.put(name, 'key', 3, None, 'model', True)
+    cache.get('a', 'key', 3, None, 'model')
+    cache.close()
+
+    cache = ClassificationCache(path, max_entries=2)
+    assert cache.get('a', 'key', 3, None, 'model') is True
+    assert cache.get('b', 'key', 3, None, 'model') is None
+    assert cache.get('c', 'key', 3, None, 'model') is True
+    cache.close()
+
+
+def test_classification_cache_contains_does_not_count(tmp_path):
+    cache = ClassificationCache(str(tmp_path / 'cache.sqlite3'))
+    cache.put('a.jpg', 'key', 3, None, 'model', False)
+    assert cache.contains('a.jpg', 'key', 3, None, 'model')
+    assert not cache.contains('b.jpg', 'key', 3, None, 'model')
+    assert (cache.hits, cache.misses) == (0, 0)
+    cache.close()
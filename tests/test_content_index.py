@@ -0,0 +1,75 @@
+import os
+import threading
+
+from file_filter_core import ContentIndex
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_files_with_unique_sizes_are_never_read(tmp_path, monkeypatch):
+    index = ContentIndex()
+    read = []
+    monkeypatch.setattr(index, 'digest', lambda path, prefix_only: read.append(path))
+    paths = [write(tmp_path / f'{size}.bin', b'x' * size) for size in range(1, 50)]
+    assert [index.find_or_add(path) for path in paths] == paths
+    assert read == []
+
+
+def test_identical_files_find_their_leader(tmp_path):
+    index = ContentIndex(prefix_size=16, chunk_size=8)
+    first = write(tmp_path / 'first.bin', b'a' * 40)
+    same_prefix = write(tmp_path / 'same_prefix.bin', b'a' * 39 + b'b')
+    copy = write(tmp_path / 'copy.bin', b'a' * 40)
+    small = write(tmp_path / 'small.bin', b'abc')
+    small_copy = write(tmp_path / 'small_copy.bin', b'abc')
+    assert index.find_or_add(first) == first
+    assert index.find_or_add(same_prefix) == same_prefix
+    assert index.find_or_add(copy) == first
+    assert index.find_or_add(small) == small
+    assert index.find_or_add(small_copy) == small
+
+
+def test_many_files_of_one_size(tmp_path):
+    index = ContentIndex()
+    paths = [write(tmp_path / f'{number}.bin', b'%08d' % (number % 500)) for number in range(1000)]
+    leaders = [index.find_or_add(path) for path in paths]
+    assert leaders[:500] == paths[:500]
+    assert leaders[500:] == paths[:500]
+
+
+def test_rename_and_discard(tmp_path):
+    index = ContentIndex()
+    original = write(tmp_path / 'original.bin', b'data')
+    index.find_or_add(original)
+    moved = str(tmp_path / 'moved.bin')
+    os.rename(original, moved)
+    index.rename(original, moved)
+    assert index.find_or_add(write(tmp_path / 'copy.bin', b'data')) == moved
+    index.discard(moved)
+    other = write(tmp_path / 'other.bin', b'data')
+    assert index.find_or_add(other) == other
+
+
+def test_leader_deleted_meanwhile_is_dropped(tmp_path):
+    index = ContentIndex()
+    gone = write(tmp_path / 'gone.bin', b'aaaa')
+    index.find_or_add(gone)
+    os.remove(gone)
+    other = write(tmp_path / 'other.bin', b'bbbb')
+    assert index.find_or_add(other) == other
+    assert index.find_or_add(write(tmp_path / 'copy.bin', b'bbbb')) == other
+
+
+def test_identical_files_added_at_once_have_one_leader(tmp_path):
+    index = ContentIndex()
+    paths = [write(tmp_path / f'{number}.bin', b'same content') for number in range(40)]
+    leaders = []
+    threads = [threading.Thread(target=lambda path=path: leaders.append(index.find_or_add(path))) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(leaders)) == 1
@@ -0,0 +1,66 @@
+import os
+import zipfile
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import file_filter_core
+from file_filter_core import FileClassifier, read_snippet, load_snippet
+
+
+def test_text_snippet_is_cut_at_a_line(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text("first   line\n\n\nsecond line\n" + "x" * 10000)
+    assert read_snippet(str(path), 30) == "first line\nsecond line"
+
+
+def test_table_snippet_keeps_the_first_rows(tmp_path):
+    path = tmp_path / 'table.csv'
+    path.write_text("".join(f"{row},value\n" for row in range(100)))
+    assert read_snippet(str(path), 4096).splitlines() == [f"{row},value" for row in range(10)]
+
+
+def test_docx_snippet(tmp_path):
+    path = tmp_path / 'letter.docx'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('word/document.xml', '<w:document><w:body><w:p><w:r><w:t>Dear cat</w:t></w:r></w:p>'
+                                              '<w:p><w:r><w:t>owner</w:t></w:r></w:p></w:body></w:document>')
+    assert read_snippet(str(path), 4096) == "Dear cat\nowner"
+
+
+def test_unreadable_documents_have_no_snippet(tmp_path, monkeypatch):
+    broken = tmp_path / 'broken.docx'
+    broken.write_bytes(b'not a zip file')
+    assert read_snippet(str(broken), 4096) is None
+    huge = tmp_path / 'huge.pdf'
+    huge.write_bytes(b'%PDF-1.4' + b' ' * 100)
+    monkeypatch.setattr(file_filter_core, 'MAX_PDF_BYTES', 50)
+    monkeypatch.setattr(file_filter_core, 'pypdf_available', lambda: True)
+    assert read_snippet(str(huge), 4096) is None
+
+
+def test_snippets_are_cached_on_disk(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text("cats")
+    cache_folder = tmp_path / 'cache'
+    assert load_snippet(str(path), 4096, str(cache_folder)) == "cats"
+    assert len(list(cache_folder.rglob('*.txt'))) == 1
+    assert load_snippet(str(path), 4096, str(cache_folder)) == "cats"
+    assert load_snippet(str(tmp_path / 'missing.txt'), 4096, str(cache_folder)) is None
+
+
+def test_a_broken_reader_pool_falls_back_to_names(tmp_path):
+    (tmp_path / 'notes.txt').write_text("cats")
+    messages = []
+    classifier = FileClassifier(str(tmp_path), str(tmp_path / 'destination'), 'cats', 3, False, 'mistral:latest',
+                                ['.txt'], read_documents=True, operation_log=None, status_callback=messages.append)
+    classifier.snippet_pool = ProcessPoolExecutor(max_workers=1)
+    crashed = classifier.snippet_pool.submit(os._exit, 1)
+    with pytest.raises(concurrent.futures.BrokenExecutor):
+        crashed.result()
+    assert FileClassifier.read_result(crashed) is None
+    classifier.submit_reads('notes.txt')
+    assert classifier.snippet_pool is None
+    assert classifier.snippet_futures == {}
+    assert messages and messages[0].startswith("Error:")
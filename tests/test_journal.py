@@ -0,0 +1,17 @@
+from file_filter_core import RunJournal
+
+
+def test_run_journal_resumes_decided_files(tmp_path):
+    parameters = {'source': 'folder', 'key': 'cats'}
+    journal = RunJournal(parameters, folder=str(tmp_path))
+    journal.record('a.jpg', True, 'copied', '/destination/a.jpg')
+    journal.record('b.jpg', False)
+    journal.record('c.jpg', None)  # Failed request, retried on resume
+    journal.close()
+
+    journal = RunJournal(parameters, folder=str(tmp_path))
+    assert journal.completed == {'a.jpg', 'b.jpg'}
+    journal.close(finished=True)
+    # A finished run starts over
+    assert RunJournal(parameters, folder=str(tmp_path)).completed == set()
+    assert RunJournal({'source': 'other'}, folder=str(tmp_path)).completed == set()
@@ -0,0 +1,52 @@
+import pytest
+
+from file_filter_core import name_stem, NameGroups
+
+
+@pytest.mark.parametrize('name, stem', [
+    ("trip_paris_001", "trip paris"),
+    ("Trip-Paris 2023-07-14", "trip paris"),
+    ("IMG_2041", ""),
+    ("20240101_123456", ""),
+])
+def test_name_stem(name, stem):
+    assert name_stem(name) == stem
+
+
+def test_name_groups_reuse_the_representative_decision():
+    groups = NameGroups(spot_check_interval=0)
+    assert groups.assign('a_1.jpg', 'a')
+    assert not groups.assign('a_2.jpg', 'a')
+    assert groups.resolve('a_1.jpg', True) is True
+    assert groups.resolve('a_2.jpg', None) is True
+    assert groups.reused == 1
+
+
+def test_name_groups_never_group_an_empty_stem():
+    groups = NameGroups()
+    assert groups.assign('IMG_0001.jpg', '')
+    assert groups.assign('IMG_0002.jpg', '')
+    assert groups.groups == {}
+
+
+def test_name_groups_requeue_members_of_a_split_group():
+    groups = NameGroups(spot_check_interval=0)
+    groups.assign('a_1.jpg', 'a')
+    groups.assign('a_2.jpg', 'a')
+    groups.assign('b_1.jpg', 'b')
+    groups.assign('b_2.jpg', 'b')
+    # An unclear answer splits the group; a confident one does not
+    groups.resolve('a_1.jpg', None)
+    groups.resolve('b_1.jpg', False, confidence=0.05)
+    assert groups.requeue('a_2.jpg')
+    assert not groups.requeue('b_2.jpg')
+    assert groups.assign('a_3.jpg', 'a')
+    assert groups.split == 1
+
+
+def test_name_groups_split_on_an_unsure_representative():
+    groups = NameGroups(spot_check_interval=0)
+    groups.assign('a_1.jpg', 'a')
+    groups.assign('a_2.jpg', 'a')
+    groups.resolve('a_1.jpg', True, confidence=0.5)
+    assert groups.requeue('a_2.jpg')
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from mock_ollama_server import MockOllamaServer
+from ollama_client import OllamaClient, OllamaError, parse_backends
+
+MESSAGES = [{'role': 'user', 'content': 'File name: cat'}]
+
+
+@pytest.fixture
+def servers():
+    started = [MockOllamaServer(latency=0.0).start() for _ in range(2)]
+    yield started
+    for server in started:
+        server.stop()
+
+
+def test_parse_backends():
+    backends = parse_backends(' localhost:11434/, openai:https://example.com:8080 ,')
+    assert [backend.base_url for backend in backends] == ['http://localhost:11434', 'https://example.com:8080']
+    assert [backend.openai_only for backend in backends] == [False, True]
+    assert [backend.base_url for backend in parse_backends('')] == ['http://localhost:11434']
+
+
+@pytest.mark.parametrize('url', ['ftp://example.com', 'http://', 'localhost:port'])
+def test_parse_backends_rejects_invalid_urls(url):
+    with pytest.raises(OllamaError):
+        parse_backends(url)
+
+
+def test_requests_are_spread_over_servers(servers):
+    with OllamaClient([server.base_url for server in servers], retries=0) as client:
+        for _ in range(10):
+            client.chat('mistral:latest', MESSAGES)
+        assert [backend.requests for backend in client.backends] == [5, 5]
+        threads = [threading.Thread(target=client.chat, args=('mistral:latest', MESSAGES)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sum(backend.requests for backend in client.backends) == 30
+        assert all(backend.in_flight == 0 for backend in client.backends)
+
+
+def test_failing_server_is_ejected_and_readmitted(servers):
+    servers[0].error_rate = 1.0
+    with OllamaClient([server.base_url for server in servers], retries=1, backoff=0.0, eject_after=2,
+                      eject_seconds=0.1, health_interval=0.05) as client:
+        for _ in range(4):
+            client.chat('mistral:latest', MESSAGES)
+        failing = client.backends[0]
+        assert failing.ejected_until is not None
+        requests_before = failing.requests
+        for _ in range(4):
+            client.chat('mistral:latest', MESSAGES)
+        assert failing.requests == requests_before
+
+        # Re-admitted by the health check once the server answers again
+        servers[0].error_rate = 0.0
+        client.closed.wait(0.5)
+        assert failing.ejected_until is None
+
+
+def test_outage_fails_once_the_wait_is_over(servers):
+    for server in servers:
+        server.error_rate = 1.0
+    with OllamaClient([server.base_url for server in servers], retries=5, backoff=0.0, eject_after=1,
+                      eject_seconds=60.0, outage_wait=0.2) as client:
+        with pytest.raises(OllamaError):
+            client.chat('mistral:latest', MESSAGES)
+
+
+def test_request_errors_become_ollama_errors(servers, monkeypatch):
+    with OllamaClient(servers[0].base_url, retries=3) as client:
+        def invalid(*args, **kwargs):
+            raise client.requests.exceptions.InvalidHeader("bad header")
+        monkeypatch.setattr(client.session, 'request', invalid)
+        with pytest.raises(OllamaError, match="bad header"):
+            client.chat('mistral:latest', MESSAGES)
+        assert client.backends[0].in_flight == 0
@@ -0,0 +1,68 @@
+import os
+
+from file_filter_core import copy_file, move_file, OperationLog
+
+
+def test_operation_log_revert(tmp_path):
+    source_folder, destination_folder = tmp_path / 'source', tmp_path / 'destination'
+    source_folder.mkdir()
+    destination_folder.mkdir()
+    for name in ('copied.txt', 'moved.txt'):
+        (source_folder / name).write_text(name)
+    copy_file(str(source_folder / 'copied.txt'), str(destination_folder / 'copied.txt'))
+    move_file(str(source_folder / 'moved.txt'), str(destination_folder / 'moved.txt'), True)
+
+    path = str(tmp_path / 'operations.jsonl')
+    log = OperationLog(path)
+    log.record('copied', str(source_folder / 'copied.txt'), str(destination_folder / 'copied.txt'))
+    log.record('moved', str(source_folder / 'moved.txt'), str(destination_folder / 'moved.txt'))
+    log.close()
+
+    # Reloaded from disk, as after a restart
+    log = OperationLog(path)
+    assert len(log.pending()) == 2
+    assert log.revert() == (2, [])
+    assert sorted(os.listdir(destination_folder)) == []
+    assert sorted(os.listdir(source_folder)) == ['copied.txt', 'moved.txt']
+    assert (source_folder / 'moved.txt').read_text() == 'moved.txt'
+    log.close()
+    assert OperationLog(path).pending() == []
+
+
+def test_operation_log_revert_keeps_files_it_cannot_restore(tmp_path):
+    (tmp_path / 'copy.txt').write_text('copy')
+    (tmp_path / 'moved.txt').write_text('moved')
+    (tmp_path / 'original.txt').write_text('taken')
+    log = OperationLog(str(tmp_path / 'operations.jsonl'))
+    # The original of the copy is gone, and a new file took the original name of the move
+    log.record('copied', str(tmp_path / 'gone.txt'), str(tmp_path / 'copy.txt'))
+    log.record('moved', str(tmp_path / 'original.txt'), str(tmp_path / 'moved.txt'))
+    reverted, errors = log.revert()
+    assert reverted == 0
+    assert sorted(destination for destination, _ in errors) == [str(tmp_path / 'copy.txt'), str(tmp_path / 'moved.txt')]
+    assert (tmp_path / 'copy.txt').read_text() == 'copy'
+    assert (tmp_path / 'original.txt').read_text() == 'taken'
+    assert len(log.pending()) == 2
+    log.close()
+
+
+def test_moved_files_can_be_reverted(source_folder, tmp_path, matching, classify):
+    destination_folder = tmp_path / 'destination'
+    expected = matching(source_folder)
+    log = OperationLog(str(tmp_path / 'operations.jsonl'))
+    classify(source_folder, destination_folder, move_files=True, operation_log=log)
+    assert sorted(os.listdir(destination_folder)) == expected
+    assert not set(expected) & set(os.listdir(source_folder))
+
+    assert log.revert() == (len(expected), [])
+    assert os.listdir(destination_folder) == []
+    assert len(os.listdir(source_folder)) == 41
+
+
+def test_runs_are_logged_unless_disabled(source_folder, tmp_path, app_data_dir, classify):
+    classify(source_folder, tmp_path / 'logged')
+    logs = os.listdir(app_data_dir / 'operations')
+    assert len(logs) == 1
+    assert len(OperationLog(str(app_data_dir / 'operations' / logs[0])).pending()) == len(os.listdir(tmp_path / 'logged'))
+    classify(source_folder, tmp_path / 'not_logged', operation_log=None)
+    assert os.listdir(app_data_dir / 'operations') == logs
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from file_filter_core import FileClassifier, ClassificationCache
+
+
+@pytest.mark.parametrize('batch_size', [1, 8])
+def test_copies_matching_files(source_folder, tmp_path, matching, classify, batch_size):
+    destination_folder = tmp_path / 'destination'
+    expected = matching(source_folder)
+    assert expected
+    copied, _ = classify(source_folder, destination_folder, max_in_flight=4, batch_size=batch_size)
+    assert sorted(os.listdir(destination_folder)) == expected
+    assert sorted(copied) == [(name, 'copied') for name in expected]
+    assert len(os.listdir(source_folder)) == 41
+
+
+def test_moves_matching_files(source_folder, tmp_path, matching, classify):
+    destination_folder = tmp_path / 'destination'
+    expected = matching(source_folder)
+    classify(source_folder, destination_folder, move_files=True, max_in_flight=4)
+    assert sorted(os.listdir(destination_folder)) == expected
+    assert len(os.listdir(source_folder)) == 41 - len(expected)
+
+
+def test_routed_run_with_numeric_categories_uses_the_cache(source_folder, tmp_path, matching, classify):
+    categories = {'2023': str(tmp_path / 'by_year_2023'), '2024': str(tmp_path / 'by_year_2024')}
+    cache = ClassificationCache(str(tmp_path / 'cache.sqlite3'))
+    for attempt in range(2):
+        for folder in categories.values():
+            if os.path.isdir(folder):
+                for name in os.listdir(folder):
+                    os.remove(os.path.join(folder, name))
+        classify(source_folder, tmp_path / 'unused', category_destinations=categories, cache=cache)
+        for category, folder in categories.items():
+            assert os.listdir(folder)
+            assert sorted(os.listdir(folder)) == matching(source_folder, category, list(categories))
+    # The second run is answered from the cache only
+    assert cache.hits == 40
+    cache.close()
+
+
+def test_prefilter_keeps_no_scores_after_a_run(source_folder, tmp_path, classify):
+    # Cache hits and content duplicates never reach the pre-filter
+    for number in range(10):
+        (source_folder / f'copy_{number}.txt').write_text(f'content {number}')
+    cache = ClassificationCache(str(tmp_path / 'cache.sqlite3'))
+    prefilters = []
+
+    # RecordingClassifier Class
+    class RecordingClassifier(FileClassifier):
+        def run(self, file_names=None):
+            prefilters.append(self.prefilter)
+            super().run(file_names)
+
+    for attempt in range(2):
+        classify(source_folder, tmp_path / f'destination_{attempt}', classifier_class=RecordingClassifier, cache=cache,
+                 prefilter_model='nomic-embed-text:latest', dedupe_content=True, max_in_flight=4)
+    assert cache.hits
+    for prefilter in prefilters:
+        assert prefilter.scores == {} and prefilter.wanted == {}
+    cache.close()
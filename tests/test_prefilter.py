@@ -0,0 +1,68 @@
+from file_filter_core import EmbeddingPrefilter
+
+# Level 3 accepts a cosine similarity from 0.72 and rejects below 0.30
+VECTORS = {'cats': [1.0, 0.0], 'dogs': [0.0, 1.0], 'cat photo': [1.0, 0.05], 'invoice': [0.0, 1.0], 'pet': [1.0, 1.0]}
+
+
+# FakeClient Class
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, model, texts):
+        self.calls.append(list(texts))
+        return [VECTORS.get(text, [0.1, 1.0]) for text in texts]
+
+
+def test_decisions_by_similarity():
+    prefilter = EmbeddingPrefilter(FakeClient(), 'embedder', ['cats'], 3)
+    assert prefilter.decide(['cat photo', 'invoice', 'pet']) == {'cat photo': True, 'invoice': False}
+    assert (prefilter.accepted, prefilter.rejected, prefilter.ambiguous) == (1, 1, 1)
+
+
+def test_routed_runs_pick_the_closest_category():
+    prefilter = EmbeddingPrefilter(FakeClient(), 'embedder', ['cats', 'dogs'], 3)
+    assert prefilter.decide(['cat photo', 'pet']) == {'cat photo': 'cats'}
+
+
+def test_announced_names_are_embedded_ahead_in_batches():
+    client = FakeClient()
+    prefilter = EmbeddingPrefilter(client, 'embedder', ['cats'], 3, batch_size=3)
+    names = [f'name {number}' for number in range(6)]
+    for name in names:
+        prefilter.expect(name)
+    for name in names:
+        prefilter.decide([name])
+        prefilter.forget(name)
+    # The targets, then two batches of three names
+    assert client.calls == [['cats'], names[:3], names[3:]]
+    assert prefilter.scores == {}
+
+
+def test_forgotten_names_are_not_embedded_or_kept():
+    client = FakeClient()
+    prefilter = EmbeddingPrefilter(client, 'embedder', ['cats'], 3, batch_size=4)
+    for name in ('a', 'b', 'c', 'd', 'e'):
+        prefilter.expect(name)
+    prefilter.forget('b')
+    prefilter.decide(['a'])
+    prefilter.forget('a')
+    assert client.calls[1] == ['a', 'c', 'd', 'e']
+    # Scored ahead, then never asked about
+    for name in ('c', 'd', 'e'):
+        prefilter.forget(name)
+    assert prefilter.scores == {} and prefilter.wanted == {}
+
+
+def test_a_name_shared_by_several_files_is_kept_until_the_last_one():
+    client = FakeClient()
+    prefilter = EmbeddingPrefilter(client, 'embedder', ['cats'], 3)
+    prefilter.expect('photo')
+    prefilter.expect('photo')
+    prefilter.expect('other')
+    prefilter.decide(['other'])
+    prefilter.forget('other')
+    prefilter.forget('photo')
+    assert 'photo' in prefilter.scores
+    prefilter.forget('photo')
+    assert prefilter.scores == {}
@@ -0,0 +1,18 @@
+import random
+
+import pytest
+
+from file_filter_core import name_stem, stratified_sample
+
+
+def test_stratified_sample_covers_extensions_and_weights_add_up():
+    file_names = [f'photo_{number}.jpg' for number in range(900)] + [f'doc_{number}.pdf' for number in range(100)]
+    sample = stratified_sample(file_names, 50, random.Random(1), name_stem)
+    assert len(sample) == 50
+    assert len({name for name, _ in sample}) == 50
+    assert sum(1 for name, _ in sample if name.endswith('.pdf')) == 5
+    assert sum(weight for _, weight in sample) == pytest.approx(len(file_names))
+
+
+def test_stratified_sample_of_a_small_folder_takes_everything():
+    assert stratified_sample(['a.jpg', 'b.jpg'], 10, random.Random(1), name_stem) == [('a.jpg', 1.0), ('b.jpg', 1.0)]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from run_metrics import RunMetrics, StageHistogram
+
+
+def test_histogram_summary():
+    histogram = StageHistogram()
+    for milliseconds in [1] * 90 + [40] * 9 + [3000]:
+        histogram.observe(milliseconds / 1000)
+    summary = histogram.summary()
+    assert summary['count'] == 100
+    assert summary['p50_ms'] == 1.0
+    assert summary['p95_ms'] == 50.0  # Upper bound of the bucket
+    assert summary['max_ms'] == 3000.0
+    assert summary['total_seconds'] == pytest.approx(3.45)
+
+
+def test_stages_are_reported_in_pipeline_order():
+    metrics = RunMetrics()
+    for stage in ('transfer', 'custom', 'http', 'scan'):
+        with metrics.timer(stage):
+            pass
+    assert list(metrics.snapshot()['stages']) == ['scan', 'http', 'transfer', 'custom']
+
+
+def test_throughput_and_eta():
+    metrics = RunMetrics()
+    for _ in range(5):
+        metrics.file_done(10, False)
+    snapshot = metrics.snapshot()
+    assert (snapshot['processed'], snapshot['total']) == (5, 10)
+    assert snapshot['files_per_second'] > 0
+    # No ETA while the scan is still counting files
+    assert snapshot['eta_seconds'] is None
+    metrics.file_done(10, True)
+    assert metrics.snapshot()['eta_seconds'] is not None
+
+
+@pytest.mark.parametrize('suffix', ['.json', '.csv', '.prom'])
+def test_reports(tmp_path, suffix):
+    metrics = RunMetrics()
+    metrics.observe('http', 0.02)
+    metrics.observe('http', 0.2)
+    metrics.set_gauges(in_flight=3)
+    metrics.file_done(1, True)
+    path = tmp_path / f'report{suffix}'
+    metrics.write_report(str(path))
+    text = path.read_text()
+    if suffix == '.json':
+        assert json.loads(text)['stages']['http']['count'] == 2
+    elif suffix == '.csv':
+        assert text.splitlines()[1].startswith('http,2,')
+    else:
+        assert 'ai_file_filter_stage_duration_seconds_bucket{stage="http",le="+Inf"} 2' in text
+        assert 'ai_file_filter_in_flight 3' in text
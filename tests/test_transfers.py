@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+from file_filter_core import FileClassifier, copy_file, move_file
+
+
+def test_copy_file(tmp_path):
+    source = tmp_path / 'source.bin'
+    data = os.urandom(300 * 1024)
+    source.write_bytes(data)
+    copy_file(str(source), str(tmp_path / 'copy.bin'))
+    assert (tmp_path / 'copy.bin').read_bytes() == data
+    assert source.read_bytes() == data
+
+
+def test_copy_file_never_overwrites(tmp_path):
+    (tmp_path / 'source.txt').write_text('new')
+    (tmp_path / 'existing.txt').write_text('old')
+    with pytest.raises(FileExistsError):
+        copy_file(str(tmp_path / 'source.txt'), str(tmp_path / 'existing.txt'))
+    assert (tmp_path / 'existing.txt').read_text() == 'old'
+
+
+@pytest.mark.parametrize('same_device', [True, False])
+def test_move_file(tmp_path, same_device):
+    (tmp_path / 'source.txt').write_text('data')
+    move_file(str(tmp_path / 'source.txt'), str(tmp_path / 'moved.txt'), same_device)
+    assert not (tmp_path / 'source.txt').exists()
+    assert (tmp_path / 'moved.txt').read_text() == 'data'
+
+
+@pytest.mark.parametrize('same_device', [True, False])
+def test_move_file_never_overwrites(tmp_path, same_device):
+    (tmp_path / 'source.txt').write_text('new')
+    (tmp_path / 'existing.txt').write_text('old')
+    with pytest.raises(FileExistsError):
+        move_file(str(tmp_path / 'source.txt'), str(tmp_path / 'existing.txt'), same_device)
+    assert (tmp_path / 'existing.txt').read_text() == 'old'
+    assert (tmp_path / 'source.txt').read_text() == 'new'
+
+
+
+def test_copy_callbacks_keep_the_file_order(source_folder, tmp_path, classify):
+    # Earlier files take longer to copy, so the transfers finish in reverse order
+    class SlowEarlyTransfers(FileClassifier):
+        def move_or_copy_file(self, source_path, destination_path):
+            number = int(os.path.splitext(os.path.basename(source_path))[0].split('_')[1])
+            time.sleep((40 - number) * 0.002)
+            return super().move_or_copy_file(source_path, destination_path)
+
+    copied, messages = classify(source_folder, tmp_path / 'destination', classifier_class=SlowEarlyTransfers,
+                                max_in_flight=4, transfer_workers=4)
+    processed = [message.split(': ', 1)[1] for message in messages if message.startswith('Processing')]
+    assert copied
+    assert [name for name, _ in copied] == [name for name in processed if name in dict(copied)]
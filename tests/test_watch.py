@@ -0,0 +1,75 @@
+import os
+import time
+import threading
+
+import file_filter_core
+from file_filter_core import FileClassifier, FolderWatcher
+from mock_ollama_server import MockOllamaServer
+from ollama_client import OllamaClient
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_folder_watcher_reports_settled_arrivals(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_filter_core, 'watchdog_available', lambda: False)
+    (tmp_path / 'old.txt').write_text('old')
+    watcher = FolderWatcher(str(tmp_path), {'.txt'}, settle_seconds=0.2, poll_interval=0.05)
+    (tmp_path / 'new.txt').write_text('new')
+    (tmp_path / 'other.bin').write_text('not watched')
+    # The first sighting only starts the settle time
+    assert watcher.poll() == []
+    time.sleep(0.25)
+    assert watcher.poll() == ['new.txt']
+    assert watcher.poll() == []
+    watcher.stop()
+
+
+def test_folder_watcher_waits_for_writes_to_stop(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_filter_core, 'watchdog_available', lambda: False)
+    watcher = FolderWatcher(str(tmp_path), {'.txt'}, settle_seconds=0.2, poll_interval=0.05)
+    growing = tmp_path / 'download.txt'
+    growing.write_text('a')
+    assert watcher.poll() == []
+    for size in range(2, 5):
+        time.sleep(0.1)
+        growing.write_text('a' * size)
+        assert watcher.poll() == []
+    time.sleep(0.25)
+    assert watcher.poll() == ['download.txt']
+    watcher.stop()
+
+
+def test_watch_classifies_arrivals_without_reusing_the_first_journal(tmp_path, app_data_dir, monkeypatch):
+    monkeypatch.setattr(file_filter_core, 'watchdog_available', lambda: False)
+    server = MockOllamaServer(latency=0.0, match_rate=1.0).start()
+    source_folder, destination_folder = tmp_path / 'source', tmp_path / 'destination'
+    source_folder.mkdir()
+    (source_folder / 'a.txt').write_text('a')
+    client = OllamaClient(server.base_url)
+    copied = []
+    messages = []
+    classifier = FileClassifier(
+        str(source_folder), str(destination_folder), 'cats', 3, False, 'mistral:latest', ['.txt'], client=client,
+        resumable=True, status_callback=messages.append, file_callback=lambda name, action, path: copied.append(name)
+    )
+    watcher = threading.Thread(target=classifier.watch, kwargs={'settle_seconds': 0.1, 'poll_interval': 0.05})
+    watcher.start()
+    try:
+        wait_for(lambda: any(message.startswith("Watching") for message in messages))
+        (source_folder / 'b.txt').write_text('b')
+        wait_for(lambda: 'b.txt' in copied)
+    finally:
+        classifier.cancel()
+        watcher.join(timeout=10)
+        client.close()
+        server.stop()
+    assert sorted(os.listdir(destination_folder)) == ['a.txt', 'b.txt']
+
+    # Only the finished journal of the first run is left; nothing is resumed from it
+    journals = os.listdir(app_data_dir / 'journals')
+    assert len(journals) == 1 and '.done-' in journals[0]